@@ -0,0 +1,58 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    """
+    Per-client rate limiting with token buckets kept in this process's memory.
+    - `rate`: tokens added to each client's bucket per second
+    - `burst`: bucket size, i.e. how many requests a client can make at once after a pause
+    - `max_clients`: buckets remembered; the least recently seen client is forgotten first
+      (and starts again with a full bucket)
+    Each server process limits on its own, so with N workers a client gets up to N times the rate.
+    """
+
+    def __init__(self, rate, burst, max_clients=100_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()  # client → (tokens, time of last update)
+        self._lock = threading.Lock()
+
+    def acquire(self, client, cost=1):
+        """Takes `cost` tokens from `client`'s bucket. Returns 0 if admitted, else seconds to wait."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0
+            else:
+                wait = max(1, math.ceil((cost - tokens) / self.rate))
+            self._buckets[client] = (tokens, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class ConcurrencyLimit:
+    """At most `limit` requests of one kind in flight in this process; acquire() never waits."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.active >= self.limit:
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
@@ -1,17 +1,196 @@
+import time
+
+_import_started = time.perf_counter()  # Start of module load, for the startup report
+
 import re
-from flask import Flask, request, send_file, render_template
-from docx import Document
+import click
+from flask import (Blueprint, Flask, Response, current_app, g, jsonify, make_response, request,
+                   render_template, stream_with_context, url_for)
+from flask.logging import default_handler
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.utils import secure_filename
 import os
 import io
 import re 
-from docx.shared import Pt 
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
-
-app = Flask(__name__)
+import csv
+import functools
+import json
+import logging
+import sys
+import random
+import threading
+import cProfile
+import zipfile
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import hashlib
+import importlib.util
+from lazy_import import lazy_callable
+from template_cache import TemplateRegistry, UnknownTemplate, find_paragraphs
+from template_plan import RepeatSlot, SectionCache, TemplatePlanError, ValueSlot, compile_plan, field
+from render_pool import RenderPool, RenderPoolBusy
+from output_cache import OutputCache, cache_key
+from admission import ConcurrencyLimit, TokenBucketLimiter
+from job_store import JobQueueFull, JobStore
+from course_schema import MAX_UNITS, MAX_VIDEOS, CourseValidationError, check_course_form, validate_course
+from course_model import Course, Unit, VideoRef
+from course_store import CourseStore
+from pdf_export import (PdfConversionError, PdfConversionTimeout, PdfConverterBusy, PdfConverterPool,
+                        PdfConverterUnavailable, find_soffice)
+import metrics
+from metrics import RequestTimings, record_stage, stage, timed
+
+# python-docx is only needed to compile templates and for the legacy render path, so it is
+# imported on first use; a process warmed from prebuilt snapshots never loads it
+Document = lazy_callable("docx", "Document")
+Pt = lazy_callable("docx.shared", "Pt")
+OxmlElement = lazy_callable("docx.oxml", "OxmlElement")
+qn = lazy_callable("docx.oxml.ns", "qn")
+serialize_part_xml = lazy_callable("docx.opc.oxml", "serialize_part_xml")
+ParagraphStamp = lazy_callable("docx_emit", "ParagraphStamp")
+
+# Routes live on a blueprint so create_app() can build configured app instances
+bp = Blueprint("syllabus", __name__)
+logger = logging.getLogger("syllabus")
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+DOCX_MIMETYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+PDF_MIMETYPE = "application/pdf"
+OUTPUT_FORMATS = {"docx": DOCX_MIMETYPE, "pdf": PDF_MIMETYPE}
+
+# Every <id>.docx in TEMPLATE_DIR, chosen per request with the `template` parameter.
+# Each is parsed once and re-parsed only when its own file changes on disk. Every .docx
+# there is listed, served and warmed, so keep only templates in it.
+TEMPLATE_DIR = os.environ.get("TEMPLATE_DIR") or os.path.join(BASE_DIR, "templates_docx")
+DEFAULT_TEMPLATE = os.environ.get("DEFAULT_TEMPLATE", "template")
+TEMPLATE_CACHE_BYTES = int(os.environ.get("TEMPLATE_CACHE_BYTES", str(256 * 1024 * 1024)))
+
+# Where compiled templates are saved so new processes skip parsing and compiling them
+# (empty turns it off; the directory must only be writable by this app, it holds pickles)
+TEMPLATE_SNAPSHOT_DIR = os.environ.get("TEMPLATE_SNAPSHOT_DIR") or None
+
+
+def _renderer_fingerprint():
+    """
+    Hash of the code that turns a template and a course into a document, so prebuilt
+    snapshots, cached documents and ETags go stale when a deploy changes the output.
+    """
+    digest = hashlib.sha256()
+    for name in ("template_cache.py", "template_plan.py", "docx_emit.py", "docx_package.py"):
+        with open(os.path.join(BASE_DIR, name), "rb") as f:
+            digest.update(f.read())
+    for path in (__file__, importlib.util.find_spec("docx").origin):  # docx/__init__.py carries its version
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+RENDERER_FINGERPRINT = _renderer_fingerprint()
+
+templates = TemplateRegistry(TEMPLATE_DIR, DEFAULT_TEMPLATE, TEMPLATE_CACHE_BYTES,
+                             TEMPLATE_SNAPSHOT_DIR, RENDERER_FINGERPRINT)
+
+# Rendered sections per template by their input, so an edit to one section of a course
+# doesn't re-render the others (SECTION_CACHE_BYTES=0 turns it off). What they hold counts
+# towards TEMPLATE_CACHE_BYTES, so many busy templates evict each other rather than grow.
+SECTION_CACHE_BYTES = int(os.environ.get("SECTION_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+# Optional worker processes for rendering (RENDER_WORKERS=0 renders in the request thread).
+# They are started fresh rather than forked from the threaded server, so each imports this
+# module and warms its own templates with warm_up().
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", "0"))
+RENDER_QUEUE_DEPTH = int(os.environ.get("RENDER_QUEUE_DEPTH", str(max(RENDER_WORKERS, 1) * 4)))
+RENDER_TIMEOUT = float(os.environ.get("RENDER_TIMEOUT", "30"))
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+# PDF export through headless LibreOffice (PDF_CONVERTER: soffice path, default from PATH)
+PDF_CONVERTER = os.environ.get("PDF_CONVERTER") or None
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", "2"))
+PDF_QUEUE_DEPTH = int(os.environ.get("PDF_QUEUE_DEPTH", str(PDF_WORKERS * 8)))
+PDF_TIMEOUT = float(os.environ.get("PDF_TIMEOUT", "60"))
+
+_pdf_converter = None
+_pdf_converter_lock = threading.Lock()
+
+# Generated documents by content hash (OUTPUT_CACHE_BYTES=0 turns caching off)
+OUTPUT_CACHE_BYTES = int(os.environ.get("OUTPUT_CACHE_BYTES", str(64 * 1024 * 1024)))
+OUTPUT_CACHE_DIR = os.environ.get("OUTPUT_CACHE_DIR") or None
+OUTPUT_CACHE_DISK_BYTES = int(os.environ.get("OUTPUT_CACHE_DISK_BYTES", str(1024 * 1024 * 1024)))
+
+output_cache = (OutputCache(OUTPUT_CACHE_BYTES, OUTPUT_CACHE_DIR, OUTPUT_CACHE_DISK_BYTES)
+                if OUTPUT_CACHE_BYTES > 0 else None)
+
+# Largest JSON body accepted by /api/v1/syllabus
+API_MAX_BYTES = int(os.environ.get("API_MAX_BYTES", str(1024 * 1024)))
+
+# Admission control for the generation endpoints, checked before the request body is read:
+# a token bucket per client address (off unless RATE_LIMIT_PER_MINUTE is set, e.g. to 60)
+# and a cap on requests in flight per kind of endpoint (0 = no cap). Both are per server
+# process. Behind a reverse proxy, set SYLLABUS_TRUSTED_PROXIES so the client address comes
+# from X-Forwarded-For; otherwise every request looks like it came from the proxy.
+RATE_LIMIT_PER_MINUTE = float(os.environ.get("RATE_LIMIT_PER_MINUTE", "0"))
+RATE_LIMIT_BURST = int(os.environ.get("RATE_LIMIT_BURST", "20"))
+MAX_CONCURRENT = {
+    "generate": int(os.environ.get("MAX_CONCURRENT_GENERATE", "16")),  # /generate, /api/v1/syllabus, /jobs
+    "batch": int(os.environ.get("MAX_CONCURRENT_BATCH", "2")),  # /generate/batch, /jobs/batch
+    "preview": int(os.environ.get("MAX_CONCURRENT_PREVIEW", "16")),  # /preview (not rate limited)
+}
+
+rate_limiter = (TokenBucketLimiter(RATE_LIMIT_PER_MINUTE / 60, RATE_LIMIT_BURST)
+                if RATE_LIMIT_PER_MINUTE > 0 else None)
+concurrency_limits = {kind: ConcurrencyLimit(limit) for kind, limit in MAX_CONCURRENT.items() if limit > 0}
+
+# Background generation jobs for the /jobs endpoints (results are kept JOB_TTL seconds, or
+# until JOB_MAX_RESULTS finished jobs or JOB_MAX_RESULT_BYTES of files push out the oldest)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_MAX_ACTIVE = int(os.environ.get("JOB_MAX_ACTIVE", "50"))
+JOB_TTL = float(os.environ.get("JOB_TTL", "600"))
+JOB_MAX_RESULTS = int(os.environ.get("JOB_MAX_RESULTS", "200"))
+JOB_MAX_RESULT_BYTES = int(os.environ.get("JOB_MAX_RESULT_BYTES", str(256 * 1024 * 1024)))
+
+_job_store = None
+_job_store_lock = threading.Lock()
+
+# COURSE_STORE_PATH=/path/to/courses.db keeps every generated course in SQLite with a
+# full-text index, for /search; off by default (/search and /courses answer 501)
+COURSE_STORE_PATH = os.environ.get("COURSE_STORE_PATH", "")
+SEARCH_MAX_RESULTS = 100
+
+_course_store = None
+_course_store_lock = threading.Lock()
+
+# Instrumentation: TIMING_LOG=1 logs one JSON line of stage timings per request;
+# PROFILE_SAMPLE_RATE=0.01 runs cProfile on ~1% of requests and writes .prof files to PROFILE_DIR.
+# Requests rendered from a compiled plan time each section as a "slot:<Placeholder>" stage;
+# the @timed replace_*/format_* stages only cover compiling the plan and python-docx fallback.
+TIMING_LOG = os.environ.get("TIMING_LOG", "") not in ("", "0")
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+
+if TIMING_LOG:
+    logger.setLevel(logging.INFO)
+
+OUTPUT_CACHE_RESULTS = metrics.Counter(
+    "syllabus_output_cache_total", "Output cache lookups by result.", ["result"])
+ADMISSION_REJECTED = metrics.Counter(
+    "syllabus_admission_rejected_total", "Requests turned away before any work, by reason.",
+    ["endpoint", "reason"])
+metrics.Gauge("syllabus_template_cache_bytes", "Approximate memory held by parsed templates.",
+              lambda: templates.loaded_bytes())
+metrics.Gauge("syllabus_render_pool_pending", "Jobs queued or running in the render pool.",
+              lambda: _render_pool.pending if _render_pool is not None else 0)
+metrics.Gauge("syllabus_job_result_bytes", "Bytes of finished job files held for download.",
+              lambda: _job_store.result_bytes if _job_store is not None else 0)
+metrics.Gauge("syllabus_course_store_pending", "Generated courses waiting to be written to the course store.",
+              lambda: _course_store.pending if _course_store is not None else 0)
+metrics.Gauge("syllabus_pdf_converter_pending", "Conversions running or waiting for a PDF converter.",
+              lambda: _pdf_converter.pending if _pdf_converter is not None else 0)
+
 # Function to clean the text by removing unwanted newlines and keeping paragraph separation
 def replace_general_placeholders(doc, placeholders):
     """
@@ -20,15 +199,13 @@ def replace_general_placeholders(doc, placeholders):
     in both paragraphs and tables while maintaining formatting.
     """
     
-    # Iterate over all paragraphs
-    for paragraph in doc.paragraphs:
-        replace_placeholders_in_paragraph(paragraph, placeholders)
-
-    # Iterate over all tables (tables contain rows → cells → paragraphs)
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
+    # Only visit paragraphs the template index says hold one of the placeholders
+    seen = set()
+    for placeholder in placeholders:
+        for tables in (False, True):
+            for paragraph in find_paragraphs(doc, placeholder, tables=tables):
+                if paragraph._element not in seen:
+                    seen.add(paragraph._element)
                     replace_placeholders_in_paragraph(paragraph, placeholders)
 
 
@@ -60,6 +237,7 @@ def replace_placeholders_in_paragraph(paragraph, placeholders):
 
 
 
+@timed
 def replace_list_section(doc, placeholder, items, title=""):
     """
     Replaces a placeholder with a properly formatted numbered list while keeping the content at the correct position.
@@ -67,7 +245,7 @@ def replace_list_section(doc, placeholder, items, title=""):
     - `items`: The list of items to insert
     - `title`: The title of the section (optional)
     """
-    for i, paragraph in enumerate(doc.paragraphs):
+    for paragraph in find_paragraphs(doc, placeholder):
         if placeholder in paragraph.text:
             parent = paragraph._element.getparent()  # Get parent XML element
             paragraph.text = ""  # Clear placeholder but keep paragraph position
@@ -90,6 +268,11 @@ def replace_list_section(doc, placeholder, items, title=""):
 
             # Insert list items directly after the placeholder
             for index, item in enumerate(items, 1):
+                if index > 1:
+                    # ✅ Later items are copies of the first with the text swapped
+                    stamp.stamp(paragraph._element, f"{index}.    ", item.strip())
+                    continue
+
                 item_paragraph = paragraph.insert_paragraph_before("")
                 item_paragraph.style = paragraph.style  # Keep same style
                 item_paragraph.paragraph_format.left_indent = paragraph_format.left_indent  # Maintain document indentation
@@ -110,95 +293,614 @@ def replace_list_section(doc, placeholder, items, title=""):
                 ind.set(qn("w:left"), "645")  # Use document's original left indentation
                 ind.set(qn("w:hanging"), "365")  # Hanging indent for text (0.25 inch)
                 pPr.append(ind)
+                stamp = ParagraphStamp(item_paragraph._element)
 
             return
 
+# Patterns for clean_pdf_text. Each matches a fixed number of characters, so every
+# pass is linear even on pages of pasted text (no nested or lazy repeats to backtrack)
+_LIST_NUMBER_RE = re.compile(r'(\d)\.(\S)')
+_BULLET_RE = re.compile(r'([-•]) ?(\S)')
+
+
 def clean_pdf_text(text):
     """Cleans extracted text while recognizing manual 'Enter' presses inside lists."""
     if not text:
         return ""
 
-    # ✅ Trim leading/trailing spaces
-    text = text.strip()
-
-    # ✅ Fix multiple spaces and tabs
-    text = re.sub(r'\s+', ' ', text)
+    # ✅ Trim leading/trailing spaces and fix multiple spaces, tabs and line breaks
+    # (after this the text holds single spaces only, so lines inside list items are joined too)
+    text = " ".join(text.split())
 
     # ✅ Ensure correct spacing after list numbers (Fixes "1.Text" → "1. Text")
-    text = re.sub(r'(\d+)\.(\S)', r'\1. \2', text)
+    text = _LIST_NUMBER_RE.sub(r'\1. \2', text)
 
     # ✅ Ensure proper spacing for bullet points ("-Text" → "- Text" & "•Text" → "• Text")
-    text = re.sub(r'(-|•)\s*(\S)', r'\1 \2', text)
-
-    # ✅ Preserve manual line breaks inside list items
-    text = re.sub(r'(\d+\..*?)\n(\s+)(\S)', r'\1 \3', text)  # Joins lines within the same numbered item
-    text = re.sub(r'(-|•)\s*(.*?)\n(\s+)(\S)', r'\1 \2 \4', text)  # Joins lines within bullet points
+    text = _BULLET_RE.sub(r'\1 \2', text)
 
     return text
 
 
+# Slot used for each placeholder when compiling the template into a render plan.
+# Every slot is captured by running its replace_* function once with marker values,
+# so the compiled output is the same XML python-docx would have produced.
+PLAN_SLOTS = {
+    "{Semester}": (False, lambda t: ValueSlot.compile(t, "{Semester}", "scalar", replace_semester)),
+    "{CourseName}": (True, lambda t: ValueSlot.compile(
+        t, "{CourseName}", "scalar", replace_course_name_in_table, tables=True)),
+    "{CourseCode}": (True, lambda t: ValueSlot.compile(
+        t, "{CourseCode}", "scalar", replace_course_code_in_table, tables=True)),
+    "{CourseDescription}": (False, lambda t: ValueSlot.compile(
+        t, "{CourseDescription}", "section", replace_course_description)),
+    "{Prerequisites}": (False, lambda t: ValueSlot.compile(t, "{Prerequisites}", "section", replace_prerequisites)),
+    "{CourseFormat}": (False, lambda t: ValueSlot.compile(t, "{CourseFormat}", "section", replace_course_format)),
+    "{AssessmentsGrading}": (False, lambda t: ValueSlot.compile(
+        t, "{AssessmentsGrading}", "section", replace_assessments_grading)),
+    "{PracticalPeriods}": (False, lambda t: ValueSlot.compile(
+        t, "{PracticalPeriods}", "scalar", replace_practical_periods)),
+    "{TotalPeriods}": (False, lambda t: ValueSlot.compile(
+        t, "{TotalPeriods}", "scalar", replace_total_periods, sample=7919, empty=0)),
+    "{Objectives}": (False, lambda t: RepeatSlot.compile(
+        t, "{Objectives}", "numbered_list",
+        lambda doc, items: replace_list_section(doc, "{Objectives}", items, title="COURSE OBJECTIVES"),
+        field("text"), counter="1")),
+    "{Experiments}": (False, lambda t: RepeatSlot.compile(
+        t, "{Experiments}", "numbered_list",
+        lambda doc, items: replace_list_section(doc, "{Experiments}", items, title="LIST OF EXPERIMENTS"),
+        field("text"), counter="1")),
+    "{Textbooks}": (False, lambda t: RepeatSlot.compile(
+        t, "{Textbooks}", "numbered_list",
+        lambda doc, items: replace_list_section(doc, "{Textbooks}", items, title="TEXTBOOKS"),
+        field("text"), counter="1")),
+    "{References}": (False, lambda t: RepeatSlot.compile(
+        t, "{References}", "numbered_list",
+        lambda doc, items: replace_list_section(doc, "{References}", items, title="REFERENCES"),
+        field("text"), counter="1")),
+    "{CourseOutcomes}": (False, lambda t: RepeatSlot.compile(
+        t, "{CourseOutcomes}", "co_list",
+        lambda doc, items: format_course_outcomes(doc, "{CourseOutcomes}", items),
+        field("text"), counter="1")),
+    "{Units}": (False, lambda t: RepeatSlot.compile(
+        t, "{Units}", "units", replace_units_with_formatting,
+        Unit(field("title"), field("content"), field("periods")), counter="1")),
+    "{YouTubeReferences}": (False, lambda t: RepeatSlot.compile(
+        t, "{YouTubeReferences}", "hyperlink_list", replace_youtube_references_with_formatting,
+        VideoRef(field("title"), field("description"), field("url")))),
+}
+
+
+def get_render_plan(template):
+    """
+    Returns the compiled RenderPlan for a template snapshot, compiling it on first use.
+    Returns None if the template can't be compiled, so callers fall back to python-docx.
+    """
+    if template.plan is None:
+        try:
+            with stage("compile_plan"):
+                sections = SectionCache(SECTION_CACHE_BYTES) if SECTION_CACHE_BYTES > 0 else None
+                template.plan = compile_plan(template, PLAN_SLOTS, sections)
+        except TemplatePlanError:
+            logger.exception("Could not compile %s, using python-docx rendering", template.path)
+            template.plan = False
+        template.save_prebuilt()
+    return template.plan or None
+
+
+def warm_up():
+    """
+    Parses every template and compiles its render plan so no request pays for it.
+    Called before gunicorn forks (workers then share the result copy-on-write) and
+    once in each render pool process. Returns False if the default template is missing.
+    """
+    ready = True
+    for template_id in [DEFAULT_TEMPLATE] + [i for i in templates.ids() if i != DEFAULT_TEMPLATE]:
+        try:
+            get_render_plan(templates.snapshot(template_id))
+        except UnknownTemplate:
+            logger.warning("%s not found; requests for it will fail until it exists", template_id)
+            ready = ready and template_id != DEFAULT_TEMPLATE
+    return ready
+
+
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+
+
+def is_warm():
+    """True once the default template is parsed and its render plan compiled (or known to be uncompilable)."""
+    template = templates.current()
+    return template is not None and template.plan is not None
+
 
-@app.route('/')
+def warm_up_in_background():
+    """Starts warm_up() on a thread unless one is already running."""
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _warm_up_thread is None or not _warm_up_thread.is_alive():
+            _warm_up_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+            _warm_up_thread.start()
+
+
+def _render_in_worker(template_id, course):
+    """
+    Pool job: renders one Course's document.xml with the worker's own cached template.
+    Returns `(document_xml, stage seconds)`; pass it to worker_result() in the server process,
+    since stages recorded in the worker would never reach /metrics.
+    """
+    timings = RequestTimings().activate()
+    try:
+        return render_course_data(templates.snapshot(template_id), course), timings.stages
+    finally:
+        timings.deactivate()
+
+
+def worker_result(result):
+    """Records the stages a _render_in_worker() job timed and returns its document.xml."""
+    document_xml, stages = result
+    for name, seconds in stages.items():
+        record_stage(name, seconds)
+    return document_xml
+
+
+def get_render_pool():
+    """Returns the shared RenderPool, starting it on first use, or None when pooling is off."""
+    global _render_pool
+    if RENDER_WORKERS <= 0:
+        return None
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = RenderPool(RENDER_WORKERS, RENDER_QUEUE_DEPTH, RENDER_TIMEOUT,
+                                      initializer=warm_up)
+        return _render_pool
+
+
+def reset_render_pool():
+    """Drops a pool whose worker died so the next request starts a fresh one."""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is not None:
+            _render_pool.shutdown(wait=False)
+            _render_pool = None
+
+
+def get_pdf_converter():
+    """Returns the shared PdfConverterPool, starting it on first use. Raises PdfConverterUnavailable."""
+    global _pdf_converter
+    with _pdf_converter_lock:
+        if _pdf_converter is None:
+            soffice = find_soffice(PDF_CONVERTER)
+            if soffice is None:
+                raise PdfConverterUnavailable("LibreOffice (soffice) is not installed")
+            _pdf_converter = PdfConverterPool(soffice, PDF_WORKERS, PDF_QUEUE_DEPTH, PDF_TIMEOUT)
+            _pdf_converter.warm()
+        return _pdf_converter
+
+
+def get_job_store():
+    """Returns the shared JobStore, starting its threads on first use."""
+    global _job_store
+    with _job_store_lock:
+        if _job_store is None:
+            _job_store = JobStore(JOB_WORKERS, JOB_MAX_ACTIVE, JOB_TTL, JOB_MAX_RESULTS, JOB_MAX_RESULT_BYTES)
+        return _job_store
+
+
+def get_course_store():
+    """Returns the shared CourseStore, opening it on first use, or None when it is turned off."""
+    global _course_store
+    if not COURSE_STORE_PATH:
+        return None
+    with _course_store_lock:
+        if _course_store is None:
+            _course_store = CourseStore(COURSE_STORE_PATH)
+        return _course_store
+
+
+def record_course(template, course):
+    """Queues a generated course for the course store; never fails the generation."""
+    try:
+        store = get_course_store()
+        if store is not None:
+            store.save(course, template.id)
+    except Exception:
+        logger.exception("Could not open the course store")
+
+
+@bp.before_app_request
+def start_request_timing():
+    g.timings = RequestTimings().activate()
+    g.profiler = None
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # Another profiler is already running in this process
+            return
+        g.profiler = profiler
+
+
+@bp.after_app_request
+def finish_request_timing(response):
+    """Records the request once its body has been sent (streamed bodies are sent after this)."""
+    timings, profiler = g.get("timings"), g.get("profiler")
+    if timings is None:
+        return response
+    endpoint = (request.endpoint or "unknown").removeprefix("syllabus.")
+    status = response.status_code
+    handled = time.perf_counter()
+
+    def on_close():
+        timings.deactivate()
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(PROFILE_DIR, f"{time.time_ns()}-{endpoint}.prof"))
+        now = time.perf_counter()
+        timings.add("send", now - handled)
+        total = now - timings.started
+        metrics.REQUEST_SECONDS.observe(total, endpoint=endpoint, status=str(status))
+        if TIMING_LOG:
+            logger.info("timing %s", json.dumps({
+                "endpoint": endpoint, "status": status,
+                "total_ms": round(total * 1000, 3), "stages": timings.as_dict(),
+            }))
+
+    response.call_on_close(on_close)
+    return response
+
+
+def error_response(message, status, headers=None):
+    """An error in the style of the current endpoint: JSON under /api/, `Error: ...` text elsewhere."""
+    if request.path.startswith("/api/"):
+        return jsonify(error=message), status, headers or {}
+    return f"Error: {message}", status, headers or {}
+
+
+@bp.app_errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    ADMISSION_REJECTED.inc(endpoint=(request.endpoint or "unknown").removeprefix("syllabus."), reason="too_large")
+    limit = request.max_content_length
+    return error_response(f"request is larger than {limit} bytes" if limit else "request is too large", 413)
+
+
+def admit(kind, max_bytes=None, rate_limit=True):
+    """
+    Route decorator for generation endpoints: answers 429 when the client has used up its
+    rate limit, or 503 when `kind` already has MAX_CONCURRENT requests in flight, before
+    the body is read. The in-flight slot is held until the response (even a streamed one) is closed.
+    `max_bytes` replaces MAX_CONTENT_LENGTH for the endpoint; `rate_limit=False` skips the rate limit.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            endpoint = view.__name__
+            if max_bytes is not None:
+                request.max_content_length = max_bytes
+            if rate_limit and rate_limiter is not None:
+                retry_after = rate_limiter.acquire(request.remote_addr or "unknown")
+                if retry_after:
+                    ADMISSION_REJECTED.inc(endpoint=endpoint, reason="rate")
+                    return error_response("too many requests, please slow down", 429,
+                                          {"Retry-After": str(retry_after)})
+            limit = concurrency_limits.get(kind)
+            if limit is None:
+                return view(*args, **kwargs)
+            if not limit.acquire():
+                ADMISSION_REJECTED.inc(endpoint=endpoint, reason="concurrency")
+                return error_response("server is busy, please retry", 503, {"Retry-After": "1"})
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                limit.release()
+                raise
+            response.call_on_close(limit.release)
+            return response
+        return wrapper
+    return decorator
+
+
+@bp.route('/healthz')
+def liveness():
+    return "ok"
+
+
+@bp.route('/readyz')
+def readiness():
+    """200 once the template is warm; 503 (and a background warm-up) until then."""
+    if not is_warm():
+        warm_up_in_background()
+        return jsonify(status="warming"), 503, {"Retry-After": "1"}
+    template = templates.current()
+    return jsonify(status="ready", template=template.version[:12], render_plan=bool(template.plan),
+                   startup=STARTUP)
+
+
+@bp.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text format. Counts are per server process; pool workers' replacer stages aren't included."""
+    return Response(metrics.render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+@bp.route('/templates')
+def list_templates():
+    """The template ids accepted by the `template` parameter, and which are loaded in memory."""
+    listing = []
+    for template_id in templates.ids():
+        template = templates.current(template_id)
+        listing.append({"id": template_id, "default": template_id == DEFAULT_TEMPLATE,
+                        "loaded": template is not None,
+                        "version": template.version[:12] if template is not None else None})
+    return jsonify(templates=listing)
+
+
+def requested_format():
+    """The `format` query parameter (or form field): "docx" (the default), "pdf", or None if unsupported."""
+    fmt = request.args.get("format")
+    if fmt is None and request.mimetype in ("application/x-www-form-urlencoded", "multipart/form-data"):
+        fmt = request.form.get("format")
+    fmt = (fmt or "docx").lower()
+    return fmt if fmt in OUTPUT_FORMATS else None
+
+
+def requested_template():
+    """
+    Returns the TemplateSnapshot named by the request's `template` query parameter
+    (or form field, for form posts); the default template when there is none.
+    Raises UnknownTemplate.
+    """
+    template_id = request.args.get("template")
+    if template_id is None and request.mimetype in ("application/x-www-form-urlencoded", "multipart/form-data"):
+        template_id = request.form.get("template")
+    with stage("template"):
+        return templates.snapshot(template_id or None)
+
+
+@bp.route('/')
 def index():
-    return render_template('index.html')  # Load the HTML form
+    return render_template('index.html', async_form=current_app.config["ASYNC_FORM"])  # Load the HTML form
 
-@app.route('/generate', methods=['POST'])
+@bp.route('/generate', methods=['POST'])
+@admit("generate")
 def generate_doc():
-    template_path = os.path.join(BASE_DIR, "template.docx")
-
-    if not os.path.exists(template_path):
-        return "Error: template.docx not found!", 404
-    doc = Document(template_path)
-   # Collect form data and clean all text fields if pasted from PDF
-    semester = request.form.get('Semester', '')
-    course_name = request.form.get('CourseName', '')
-    course_code = request.form.get('CourseCode', '')
-    course_description = clean_pdf_text(request.form.get('CourseDescription', ''))
-    prerequisites =clean_pdf_text(request.form.get('Prerequisites', ''))
-    objectives = [clean_pdf_text(obj.strip()) for obj in request.form.getlist('objective') if obj.strip()]
-    experiments = [clean_pdf_text(obj.strip()) for obj in request.form.getlist('experiments') if obj.strip()]
-    course_outcomes = [clean_pdf_text(outcome.strip()) for outcome in request.form.getlist('course_outcome') if outcome.strip()]
-    textbooks = [clean_pdf_text(textbook.strip()) for textbook in request.form.getlist('textbook') if textbook.strip()]
-    references = [clean_pdf_text(reference.strip()) for reference in request.form.getlist('reference') if reference.strip()]
-    assessments_grading = clean_pdf_text(request.form.get('AssessmentsGrading', ''))
-    course_format = clean_pdf_text(request.form.get('courseformat', ''))
-    assessments = clean_pdf_text(request.form.get('assessments', ''))
-    grading = clean_pdf_text(request.form.get('grading', ''))
-    # Format placeholders into readable lists and apply `<REMOVE>` for empty values
-    placeholders = {
-        "{Semester}": semester if semester else "<REMOVE>",
-        "{CourseName}": course_name if course_name else "<REMOVE>",
-        "{CourseCode}": course_code if course_code else "<REMOVE>",
-        "{Coursedescriptionname}": "COURSE DESCRIPTION" if course_description else "<REMOVE>",
-        "{CourseDescription}": course_description if course_description else "<REMOVE>",
-        "{prerequisitename}": "PREREQUISITES" if prerequisites else "<REMOVE>",
-        "{Prerequisites}": prerequisites if prerequisites else "<REMOVE>",
-        "{AssessmentsGrading}": assessments_grading if assessments_grading else "<REMOVE>",
-        "{CourseFormat}": course_format if course_format else "<REMOVE>",
-        "{Assessments}": assessments if assessments else "<REMOVE>",
-        "{Grading}": grading if grading else "<REMOVE>",
-    }
-
-    # Collect Practical Periods checkbox and value
-    has_practical = request.form.get('hasPractical')  
-    practical_periods = request.form.get('practical_periods') if has_practical else "<REMOVE>"
-    # Add practical periods to placeholders if applicable
-    if has_practical and practical_periods:
-        placeholders["{PracticalPeriodsName}"] = "PRACTICAL PERIODS "
-        placeholders["{PracticalPeriods}"] = practical_periods if practical_periods else "<REMOVE>"
-    else:
-        placeholders["{PracticalPeriodsName}"] = "<REMOVE>"
-        placeholders["{PracticalPeriods}"] = "<REMOVE>"
+    try:
+        template = requested_template()
+    except UnknownTemplate as e:
+        return f"Error: {e}!", 404
+
+    fmt = requested_format()
+    if fmt is None:
+        return "Error: format must be docx or pdf", 400
 
-    # Dynamically collect and format units including the number of periods
+    with stage("parse_form"):
+        form = request.form
+        try:
+            check_course_form(form)
+        except CourseValidationError as e:
+            return "Error: " + "; ".join(e.errors[:10]), 400
+    with stage("clean"):
+        course = read_course_form(form)
+    return course_response(template, course, fmt)
+
+
+# Section order for /preview when a template has no compiled plan (the default template's order)
+PREVIEW_ORDER = ("{Semester}", "{CourseName}", "{CourseCode}", "{Objectives}", "{CourseDescription}",
+                 "{Prerequisites}", "{Units}", "{TotalPeriods}", "{Experiments}", "{PracticalPeriods}",
+                 "{CourseFormat}", "{AssessmentsGrading}", "{CourseOutcomes}", "{Textbooks}", "{References}",
+                 "{YouTubeReferences}")
+
+
+@bp.route('/preview', methods=['POST'])
+@admit("preview", rate_limit=False)  # Called on every (debounced) edit, so it doesn't use up generate's budget
+def preview_doc():
+    """
+    Same form as /generate, answered with the syllabus as an HTML fragment in the template's
+    section order, for script.js's live preview. Nothing is rendered into a .docx.
+    """
+    try:
+        template = requested_template()
+    except UnknownTemplate as e:
+        return f"Error: {e}!", 404
+
+    with stage("parse_form"):
+        form = request.form
+        try:
+            check_course_form(form)
+        except CourseValidationError as e:
+            return "Error: " + "; ".join(e.errors[:10]), 400
+    with stage("clean"):
+        course = read_course_form(form)
+    plan = get_render_plan(template)
+    with stage("render"):
+        return render_template("preview.html", course=course,
+                               sections=plan.names if plan is not None else PREVIEW_ORDER)
+
+
+@bp.route('/api/v1/syllabus', methods=['POST'])
+@admit("generate", max_bytes=API_MAX_BYTES + 1)  # Its own API_MAX_BYTES check answers in JSON
+def api_generate_doc():
+    """
+    Generates a syllabus from a JSON document (see course_schema) instead of form fields.
+    Bodies over API_MAX_BYTES get 413; schema problems get 400 with every error listed.
+    """
+    if request.mimetype != "application/json":
+        return jsonify(error="Content-Type must be application/json"), 415
+    if request.content_length is not None and request.content_length > API_MAX_BYTES:
+        return jsonify(error=f"body is larger than {API_MAX_BYTES} bytes"), 413
+    fmt = requested_format()
+    if fmt is None:
+        return jsonify(error="format must be docx or pdf"), 400
+
+    try:
+        template = requested_template()
+    except UnknownTemplate as e:
+        return jsonify(error=str(e)), 404
+
+    with stage("parse_json"):
+        body = request.stream.read(API_MAX_BYTES + 1)  # Bounded even without Content-Length
+        if len(body) > API_MAX_BYTES:
+            return jsonify(error=f"body is larger than {API_MAX_BYTES} bytes"), 413
+        try:
+            document = json.loads(body)
+        except ValueError as e:
+            return jsonify(error=f"invalid JSON ({e})"), 400
+
+    with stage("clean"):
+        try:
+            course = read_course_json(document)
+        except CourseValidationError as e:
+            return jsonify(error="invalid syllabus document", details=e.errors[:50]), 400
+    return course_response(template, course, fmt)
+
+
+def course_response(template, course, fmt="docx"):
+    """Answers a generate request for a cleaned course: 304, a cached file, or a fresh render."""
+    # Same cleaned course + same template + same renderer → same document, so the key doubles as the ETag
+    key = document_key(template, course)
+    etag = key if fmt == "docx" else f"{key}-{fmt}"
+    if etag in request.if_none_match:
+        OUTPUT_CACHE_RESULTS.inc(result="not_modified")
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    try:
+        if fmt == "pdf":
+            data = course_pdf(template, course, key, block=False)
+        else:
+            data = course_docx(template, course, key, block=False, stream=True)
+    except RenderPoolBusy as e:
+        return "Error: server is busy, please retry", 503, {"Retry-After": str(e.retry_after)}
+    except FutureTimeoutError:
+        return "Error: document generation timed out", 504
+    except BrokenProcessPool:  # render_document_xml already dropped the dead pool
+        return "Error: renderer crashed, please retry", 503, {"Retry-After": "1"}
+    except PdfConverterUnavailable:
+        return "Error: PDF export is not available on this server", 501
+    except PdfConverterBusy as e:
+        return "Error: PDF converter is busy, please retry", 503, {"Retry-After": str(e.retry_after)}
+    except PdfConversionTimeout:
+        return "Error: PDF conversion timed out", 504
+    except PdfConversionError:
+        logger.exception("PDF conversion failed")
+        return "Error: PDF conversion failed", 500
+
+    response = Response(data, mimetype=OUTPUT_FORMATS[fmt],
+                        headers={"Content-Disposition": f'attachment; filename="Course_Syllabus.{fmt}"'})
+    response.set_etag(etag)
+    return response
+
+
+def render_document_xml(template, course, block=False):
+    """
+    Renders a cleaned course on the render pool when one is configured, else in this thread.
+    With `block`, waits for a pool slot instead of raising RenderPoolBusy.
+    """
+    pool = get_render_pool()
+    if pool is None:
+        return render_course_data(template, course)
+    try:
+        return worker_result(pool.submit(_render_in_worker, template.id, course, block=block)
+                             .result(timeout=pool.timeout))
+    except BrokenProcessPool:
+        reset_render_pool()
+        raise
+
+
+def document_key(template, course):
+    """The output cache key of a cleaned course rendered with a template by this version of the code."""
+    return cache_key(template.version, course.key_data(), RENDERER_FINGERPRINT)
+
+
+def course_docx(template, course, key=None, block=True, stream=False, record=True):
+    """
+    Returns the .docx bytes for a cleaned course, using and filling the output cache.
+    With `stream`, a freshly rendered zip comes back as an iterator of chunks instead, and
+    goes into the cache once its last chunk has been produced.
+    With `record`, the course goes to the course store once its document is rendered or cached.
+    """
+    key = key or document_key(template, course)
+    data = output_cache.get(key) if output_cache is not None else None
+    if data is not None:
+        OUTPUT_CACHE_RESULTS.inc(result="hit")
+        if record:
+            record_course(template, course)
+        return data
+    if output_cache is not None:
+        OUTPUT_CACHE_RESULTS.inc(result="miss")
+
+    with stage("render"):
+        document_xml = render_document_xml(template, course, block=block)
+    if record:
+        record_course(template, course)
+    if stream:
+        # Stream the zip as it is written; template parts are copied without re-compressing
+        chunks = metrics.timed_iter("package", template.iter_docx(document_xml))
+        return chunks if output_cache is None else cache_when_done(key, chunks)
+    with stage("package"):
+        data = template.build_docx(document_xml)
+    if output_cache is not None:
+        output_cache.put(key, data)
+    return data
+
+
+def cache_when_done(key, chunks):
+    """Yields a document's chunks and puts the whole document in the output cache after the last one."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    output_cache.put(key, b"".join(parts))  # Not reached if the client disconnects part way
+
+
+def course_pdf(template, course, key=None, block=True):
+    """Returns the PDF bytes for a cleaned course, cached next to its .docx under the same key."""
+    key = key or document_key(template, course)
+    data = output_cache.get(key, ".pdf") if output_cache is not None else None
+    if data is not None:
+        OUTPUT_CACHE_RESULTS.inc(result="hit")
+        record_course(template, course)
+        return data
+
+    converter = get_pdf_converter()  # Fail before rendering if there is no converter
+    docx = course_docx(template, course, key, block=block, record=False)
+    with stage("convert_pdf"):
+        data = converter.convert(docx, block=block)
+    record_course(template, course)
+    if output_cache is not None:
+        output_cache.put(key, data, ".pdf")
+    return data
+
+
+def render_course(template, form):
+    """Builds one syllabus from form-like course data and returns the .docx bytes."""
+    return template.build_docx(render_course_xml(template, form))
+
+
+def render_course_xml(template, form):
+    """
+    Builds one syllabus from form-like course data and returns its word/document.xml bytes.
+    - `template`: a TemplateSnapshot from the `templates` registry
+    - `form`: anything with `.get()` / `.getlist()` keyed like index.html's fields
+    """
+    return render_course_data(template, read_course_form(form))
+
+
+def read_course_form(form):
+    """
+    Collects the course fields from form-like data and cleans text pasted from PDFs.
+    Returns a Course.
+    """
+    # Practical periods only count when the checkbox is ticked
+    has_practical = form.get('hasPractical')
+
+    # Dynamically collect units including the number of periods
     units = []
-    total_periods = 0
     i = 1
 
-    while True:
-        unit_title = clean_pdf_text(request.form.get(f'unit_title_{i}', ''))
-        unit_content = clean_pdf_text(request.form.get(f'unit_content_{i}', ''))
-        unit_periods = request.form.get(f'unit_periods_{i}')
+    while i <= MAX_UNITS:
+        unit_title = clean_pdf_text(form.get(f'unit_title_{i}', ''))
+        unit_content = clean_pdf_text(form.get(f'unit_content_{i}', ''))
+        unit_periods = form.get(f'unit_periods_{i}')
 
         if not unit_title or not unit_content:
             break
@@ -208,70 +910,444 @@ def generate_doc():
         except ValueError:
             unit_periods = 0
 
-        total_periods += unit_periods
-        units.append((unit_title, unit_content, unit_periods))
+        units.append(Unit(unit_title, unit_content, unit_periods))
         i += 1
-    # Format units into a structured text block with periods
-    units_text = ""
-    for i, (unit_title, unit_content, unit_periods) in enumerate(units, 1):
-        units_text += f"UNIT {i}: {unit_title} (No. of Periods: {unit_periods})\n{unit_content}"
-    # Add formatted units and total periods to placeholders
-
-
 
     youtube_references = []
     i = 1
 
-    while True:
-        youtube_title = clean_pdf_text(request.form.get(f'youtube_title_{i}', ''))
-        youtube_desc = clean_pdf_text(request.form.get(f'youtube_desc_{i}', ''))
-        youtube_url = request.form.get(f'youtube_url_{i}', '')
+    while i <= MAX_VIDEOS:
+        youtube_title = clean_pdf_text(form.get(f'youtube_title_{i}', ''))
+        youtube_desc = clean_pdf_text(form.get(f'youtube_desc_{i}', ''))
+        youtube_url = form.get(f'youtube_url_{i}', '')
 
         if not youtube_title or not youtube_desc or not youtube_url:
             break  # Stop if any field is missing
 
-        youtube_references.append((youtube_title, youtube_desc, youtube_url))
+        youtube_references.append(VideoRef(youtube_title, youtube_desc, youtube_url))
         i += 1
 
-    youtube_text = ""
-    for i, (youtube_title, youtube_desc, youtube_url) in enumerate(youtube_references, 1):
-        youtube_text += f"Video {i}: {youtube_title}\nDescription: {youtube_desc}\nURL: {youtube_url}\n\n"
-    placeholders["{TotalPeriods}"] ="NUMBER OF THEORY PERIODS:" + str(total_periods) if total_periods > 0 else "<REMOVE>"
-    replace_list_section(doc, "{Objectives}", objectives, title="COURSE OBJECTIVES")
-    replace_list_section(doc, "{Experiments}", experiments,title = "LIST OF EXPERIMENTS")
-    replace_list_section(doc, "{Textbooks}", textbooks, title="TEXTBOOKS")
-    replace_list_section(doc, "{References}", references, title="REFERENCES")
-    format_course_outcomes(doc, "{CourseOutcomes}", course_outcomes)
-    replace_units_with_formatting(doc, units)
-    replace_semester(doc, semester)
-    replace_course_name_in_table(doc, course_name)
-    replace_course_code_in_table(doc, course_code)
-    replace_course_description(doc, course_description)
-    replace_prerequisites(doc, prerequisites)
-    replace_course_format(doc, course_format)
-    replace_assessments_grading(doc, assessments_grading)
-    replace_practical_periods(doc, practical_periods)    
-    total_periods = request.form.get('TotalPeriods', '')
-    practical_periods = request.form.get('PracticalPeriods', '')
-    replace_youtube_references_with_formatting(doc, youtube_references)
-    # ✅ Call functions to replace placeholders
-    replace_total_periods(doc, units)
-    replace_practical_periods(doc, practical_periods)
-    # Save and return the generated document
-    file_stream = io.BytesIO()
-    doc.save(file_stream)
-    file_stream.seek(0)
-
-    return send_file(file_stream, as_attachment=True, download_name="Course_Syllabus.docx",
-                     mimetype="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+    # Collect form data and clean all text fields if pasted from PDF
+    return Course(
+        semester=form.get('Semester', ''),
+        course_name=form.get('CourseName', ''),
+        course_code=form.get('CourseCode', ''),
+        course_description=clean_pdf_text(form.get('CourseDescription', '')),
+        prerequisites=clean_pdf_text(form.get('Prerequisites', '')),
+        course_format=clean_pdf_text(form.get('courseformat', '')),
+        assessments_grading=clean_pdf_text(form.get('AssessmentsGrading', '')),
+        practical_periods=(form.get('practical_periods') or '') if has_practical else '',
+        objectives=clean_list(form.getlist('objective')),
+        experiments=clean_list(form.getlist('experiments')),
+        course_outcomes=clean_list(form.getlist('course_outcome')),
+        textbooks=clean_list(form.getlist('textbook')),
+        references=clean_list(form.getlist('reference')),
+        units=tuple(units),
+        youtube_references=tuple(youtube_references),
+    )
+
+
+def clean_list(items):
+    """Cleans list entries and drops the blank ones (empty inputs the user never filled)."""
+    return tuple(clean_pdf_text(item.strip()) for item in items if item.strip())
+
+
+def read_course_json(document):
+    """
+    Like read_course_form(), for a decoded /api/v1/syllabus document.
+    Raises CourseValidationError if it doesn't match course_schema.
+    """
+    course = validate_course(document)
+    return Course(
+        semester=course["semester"],
+        course_name=course["course_name"],
+        course_code=course["course_code"],
+        course_description=clean_pdf_text(course["course_description"]),
+        prerequisites=clean_pdf_text(course["prerequisites"]),
+        course_format=clean_pdf_text(course["course_format"]),
+        assessments_grading=clean_pdf_text(course["assessments_grading"]),
+        practical_periods=course["practical_periods"],
+        objectives=clean_list(course["objectives"]),
+        experiments=clean_list(course["experiments"]),
+        course_outcomes=clean_list(course["course_outcomes"]),
+        textbooks=clean_list(course["textbooks"]),
+        references=clean_list(course["references"]),
+        units=tuple(Unit(clean_pdf_text(unit["title"]), clean_pdf_text(unit["content"]), unit["periods"])
+                    for unit in course["units"]),
+        youtube_references=tuple(
+            VideoRef(clean_pdf_text(video["title"]), clean_pdf_text(video["description"]), video["url"])
+            for video in course["youtube_references"]),
+    )
+
+
+def render_course_data(template, course):
+    """Renders a Course and returns its word/document.xml bytes."""
+    plan = get_render_plan(template)
+    if plan is not None:
+        # ✅ Fast path: splice the values into the compiled template
+        return plan.render({
+            "{Semester}": course.semester or None,
+            "{CourseName}": course.course_name or None,
+            "{CourseCode}": course.course_code or None,
+            "{CourseDescription}": course.course_description or None,
+            "{Prerequisites}": course.prerequisites.strip() or None,
+            "{CourseFormat}": course.course_format if course.course_format.strip() else None,
+            "{AssessmentsGrading}": course.assessments_grading if course.assessments_grading.strip() else None,
+            "{PracticalPeriods}": course.practical_periods or None,
+            "{TotalPeriods}": str(course.total_periods) if course.total_periods > 0 else None,
+            "{Objectives}": [{"text": item} for item in course.objectives],
+            "{Experiments}": [{"text": item} for item in course.experiments],
+            "{Textbooks}": [{"text": item} for item in course.textbooks],
+            "{References}": [{"text": item} for item in course.references],
+            "{CourseOutcomes}": [{"text": outcome} for outcome in course.course_outcomes],
+            "{Units}": [{"title": unit.title, "content": unit.content, "periods": str(unit.periods)}
+                        for unit in course.units],
+            "{YouTubeReferences}": [{"title": video.title, "description": video.description, "url": video.url}
+                                    for video in course.youtube_references],
+        })
+
+    doc = template.new_document()
+    replace_list_section(doc, "{Objectives}", course.objectives, title="COURSE OBJECTIVES")
+    replace_list_section(doc, "{Experiments}", course.experiments, title="LIST OF EXPERIMENTS")
+    replace_list_section(doc, "{Textbooks}", course.textbooks, title="TEXTBOOKS")
+    replace_list_section(doc, "{References}", course.references, title="REFERENCES")
+    format_course_outcomes(doc, "{CourseOutcomes}", course.course_outcomes)
+    replace_units_with_formatting(doc, course.units)
+    replace_semester(doc, course.semester)
+    replace_course_name_in_table(doc, course.course_name)
+    replace_course_code_in_table(doc, course.course_code)
+    replace_course_description(doc, course.course_description)
+    replace_prerequisites(doc, course.prerequisites)
+    replace_course_format(doc, course.course_format)
+    replace_assessments_grading(doc, course.assessments_grading)
+    replace_practical_periods(doc, course.practical_periods)
+    replace_youtube_references_with_formatting(doc, course.youtube_references)
+    replace_total_periods(doc, course.total_periods)
+    # Return the generated document part
+    return serialize_part_xml(doc.element)
+
+
+# Largest number of courses, and largest upload in bytes, accepted by /generate/batch
+BATCH_MAX_COURSES = 500
+BATCH_MAX_BYTES = int(os.environ.get("BATCH_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+def parse_course_records(data, fmt):
+    """
+    Parses a batch upload into MultiDicts shaped like `request.form`.
+    - `fmt`: "json" (array of objects), "jsonl" (one object per line) or "csv"
+    Record keys are the form field names (`CourseName`, `objective`, `unit_title_1`, ...);
+    list values become repeated fields. In CSV, repeat a column header to send several values.
+    Raises ValueError on malformed input.
+    """
+    text = data.decode("utf-8-sig") if isinstance(data, bytes) else data
+
+    if fmt == "csv":
+        rows = list(csv.reader(io.StringIO(text)))
+        if not rows:
+            return []
+        header = rows[0]
+        return [MultiDict([(key, value) for key, value in zip(header, row) if value])
+                for row in rows[1:] if any(row)]
+
+    if fmt == "jsonl":
+        objects = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        objects = json.loads(text)
+        if not isinstance(objects, list):
+            raise ValueError("expected a JSON array of courses")
+
+    records = []
+    for obj in objects:
+        if not isinstance(obj, dict):
+            raise ValueError("each course must be a JSON object")
+        record = MultiDict()
+        for key, value in obj.items():
+            for item in (value if isinstance(value, list) else [value]):
+                if item is None or item is False:
+                    continue
+                record.add(key, "on" if item is True else str(item))
+        records.append(record)
+    return records
+
+
+def generate_batch(records, template=None, pool=None):
+    """
+    Renders many courses against one template snapshot, or across `pool` when given.
+    Yields `(filename, document_xml, error)` in input order; a course that fails yields its
+    error instead of XML. If a pool worker dies, the pool is reset and the rest of the batch
+    is rendered in this process. Package the XML with `template.iter_docx()`.
+    """
+    template = template or templates.snapshot()
+    courses = [read_course_form(form) for form in records]
+    done = 0
+
+    if pool is not None:
+        jobs = pool.map(_render_in_worker, ((template.id, course) for course in courses))
+        try:
+            for (_, course), future in jobs:
+                done += 1
+                # The course in flight may be what killed the worker, so it is reported rather than retried
+                yield _batch_entry(template, done, course, lambda: worker_result(future.result(timeout=pool.timeout)))
+                if future.done() and not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+                    raise future.exception()
+        except BrokenProcessPool:
+            # A dead worker fails every queued job; finish the batch here so the archive still closes
+            logger.exception("Render pool broke during batch; rendering %d remaining courses in-process", len(courses) - done)
+            reset_render_pool()
+
+    remaining = courses[done:]
+    if remaining:
+        get_render_plan(template)  # Compile once up front rather than inside the first course
+    for n, course in enumerate(remaining, done + 1):
+        yield _batch_entry(template, n, course, lambda: render_course_data(template, course))
+
+
+def _batch_entry(template, n, course, render):
+    """Runs `render()` for batch course `n`, returning `(filename, document_xml, error)`."""
+    label = secure_filename(course.course_code or course.course_name) or "course"
+    filename = f"{n:03d}_{label}.docx"  # Numbered so repeated course codes don't collide
+
+    try:
+        data = render()
+    except Exception as e:
+        logger.exception("Batch course %d (%s) failed", n, label)
+        return filename, None, f"{e.__class__.__name__}: {e}"
+    record_course(template, course)
+    return filename, data, None
+
+
+class _ChunkWriter:
+    """Write-only file object that hands written bytes to a streaming response."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_batch_zip(records, template=None, pool=None):
+    """Yields a ZIP archive of the generated .docx files chunk by chunk, one course at a time."""
+    template = template or templates.snapshot()
+    sink = _ChunkWriter()
+    errors = []
+    # .docx files are already deflated, so store them as-is
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as archive:
+        for filename, document_xml, error in generate_batch(records, template, pool):
+            if error:
+                errors.append(f"{filename}: {error}")
+                continue
+            with archive.open(filename, "w") as entry:
+                for chunk in template.iter_docx(document_xml):
+                    entry.write(chunk)
+                    yield sink.drain()
+        if errors:
+            archive.writestr("errors.txt", "\n".join(errors) + "\n")
+    yield sink.drain()
+
+
+@bp.route('/search')
+def search_courses():
+    """
+    Full-text search over every course generated (or indexed) so far, best match first.
+    - `q`: words and "quoted phrases" that must all appear; `graph*` matches as a prefix
+    - `limit` (up to SEARCH_MAX_RESULTS) and `offset`: which page of results to return
+    Matches the code and name, description, units and experiments, objectives and outcomes,
+    and textbooks, references and videos.
+    """
+    store = get_course_store()
+    if store is None:
+        return jsonify(error="course search is not enabled on this server"), 501
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify(error="q is required"), 400
+    limit = request.args.get("limit", 20, type=int)
+    offset = request.args.get("offset", 0, type=int)
+    if not 1 <= limit <= SEARCH_MAX_RESULTS or offset < 0:
+        return jsonify(error=f"limit must be 1 to {SEARCH_MAX_RESULTS} and offset at least 0"), 400
+
+    with stage("search"):
+        total, results = store.search(query, limit, offset)
+    for result in results:
+        result["url"] = url_for("syllabus.get_course", course_id=result["id"])
+    return jsonify(query=query, total=total, results=results)
+
+
+@bp.route('/courses/<int:course_id>')
+def get_course(course_id):
+    """A stored course; its `document` can be posted back to /api/v1/syllabus."""
+    store = get_course_store()
+    if store is None:
+        return jsonify(error="course search is not enabled on this server"), 501
+    course = store.get(course_id)
+    if course is None:
+        return jsonify(error="course not found"), 404
+    return jsonify(course)
+
+
+def read_batch_records():
+    """
+    Reads the courses of a batch upload from the current request.
+    Returns `(records, None)`, or `(None, error_response)` when the upload is unusable.
+    """
+    upload = request.files.get("file")
+    if upload is not None:
+        data = upload.read()
+        fmt = os.path.splitext(upload.filename or "")[1].lstrip(".").lower()
+    else:
+        data = request.get_data()
+        fmt = {"text/csv": "csv", "application/x-ndjson": "jsonl",
+               "application/jsonl": "jsonl"}.get(request.mimetype, "json")
+    if fmt == "ndjson":
+        fmt = "jsonl"
+    if fmt not in ("json", "jsonl", "csv"):
+        return None, ("Error: upload must be .json, .jsonl or .csv", 400)
+
+    try:
+        records = parse_course_records(data, fmt)
+    except ValueError as e:  # json.JSONDecodeError and UnicodeDecodeError are ValueErrors
+        return None, (f"Error: could not read courses ({e})", 400)
+    if not records:
+        return None, ("Error: no courses found in upload", 400)
+    if len(records) > BATCH_MAX_COURSES:
+        return None, (f"Error: at most {BATCH_MAX_COURSES} courses per batch", 413)
+
+    errors = []
+    for n, record in enumerate(records, 1):
+        try:
+            check_course_form(record)
+        except CourseValidationError as e:
+            errors.extend(f"course {n}: {error}" for error in e.errors)
+    if errors:
+        return None, ("Error: " + "; ".join(errors[:10]), 400)
+    return records, None
 
 
+@bp.route('/generate/batch', methods=['POST'])
+@admit("batch", max_bytes=BATCH_MAX_BYTES)
+def generate_batch_doc():
+    """
+    Generates a ZIP of syllabi from a JSON array, JSON Lines or CSV upload, sent either as
+    the request body (by Content-Type) or as a multipart file named `file` (by extension).
+    """
+    try:
+        template = requested_template()
+    except UnknownTemplate as e:
+        return f"Error: {e}!", 404
+
+    records, error = read_batch_records()
+    if error:
+        return error
+
+    pool = get_render_pool()
+    if pool is not None and pool.pending >= pool.max_pending:
+        return "Error: server is busy, please retry", 503, {"Retry-After": str(pool.retry_after())}
+
+    return Response(stream_with_context(iter_batch_zip(records, template, pool)), mimetype="application/zip",
+                    headers={"Content-Disposition": 'attachment; filename="Course_Syllabi.zip"'})
+
+
+def _batch_zip(records, template):
+    """Job body for /jobs/batch: the whole batch ZIP as bytes."""
+    return b"".join(iter_batch_zip(records, template, get_render_pool()))
+
+
+def _submit_job(kind, fn, *args, filename, mimetype):
+    """Queues a job and returns the 202 response pointing at its status URL."""
+    try:
+        job = get_job_store().submit(kind, fn, *args, filename=filename, mimetype=mimetype)
+    except JobQueueFull:
+        return "Error: too many jobs waiting, please retry", 503, {"Retry-After": "5"}
+    status_url = url_for("syllabus.job_status", job_id=job.id)
+    return jsonify(dict(job.as_dict(), status_url=status_url)), 202, {"Location": status_url}
+
+
+@bp.route('/jobs', methods=['POST'])
+@admit("generate")
+def create_job():
+    """Same form as /generate, but returns a job id at once and renders in the background."""
+    try:
+        template = requested_template()
+    except UnknownTemplate as e:
+        return f"Error: {e}!", 404
+    fmt = requested_format()
+    if fmt is None:
+        return "Error: format must be docx or pdf", 400
+    if fmt == "pdf":
+        try:
+            get_pdf_converter()
+        except PdfConverterUnavailable:
+            return "Error: PDF export is not available on this server", 501
+
+    try:
+        check_course_form(request.form)
+    except CourseValidationError as e:
+        return "Error: " + "; ".join(e.errors[:10]), 400
+    course = read_course_form(request.form)
+    return _submit_job("course", course_pdf if fmt == "pdf" else course_docx, template, course,
+                       filename=f"Course_Syllabus.{fmt}", mimetype=OUTPUT_FORMATS[fmt])
+
+
+@bp.route('/jobs/batch', methods=['POST'])
+@admit("batch", max_bytes=BATCH_MAX_BYTES)
+def create_batch_job():
+    """Same upload as /generate/batch, rendered in the background."""
+    try:
+        template = requested_template()
+    except UnknownTemplate as e:
+        return f"Error: {e}!", 404
+
+    records, error = read_batch_records()
+    if error:
+        return error
+    return _submit_job("batch", _batch_zip, records, template,
+                       filename="Course_Syllabi.zip", mimetype="application/zip")
+
+
+@bp.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Job state as JSON; `result_url` appears once the file is ready."""
+    job = get_job_store().get(job_id)
+    if job is None:
+        return "Error: job not found (it may have expired)", 404
+
+    body = job.as_dict()
+    if job.status == "done":
+        body["result_url"] = url_for("syllabus.job_result", job_id=job.id)
+        return jsonify(body)
+    return jsonify(body), 200, ({} if job.status == "failed" else {"Retry-After": "1"})
+
+
+@bp.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = get_job_store().get(job_id)
+    if job is None:
+        return "Error: job not found (it may have expired)", 404
+    if job.status == "failed":
+        return f"Error: generation failed ({job.error})", 500
+    if job.status != "done":
+        return "Error: job is not finished yet", 409, {"Retry-After": "1"}
+    return Response(job.result, mimetype=job.mimetype,
+                    headers={"Content-Disposition": f'attachment; filename="{job.filename}"'})
+
+
+@timed
 def replace_semester(doc, semester):
     """Replaces the {Semester} placeholder with the actual semester value."""
     placeholder = "{Semester}"
     value = semester if semester else "<REMOVE>"
 
-    for paragraph in doc.paragraphs:
+    for paragraph in find_paragraphs(doc, placeholder):
         if placeholder in paragraph.text:
             paragraph.text = paragraph.text.replace(placeholder, value)
 
@@ -282,60 +1358,57 @@ def replace_semester(doc, semester):
             return
 
 
+@timed
 def replace_course_name_in_table(doc, course_name):
     """Finds and replaces {CourseName} inside tables while maintaining formatting."""
     placeholder = "{CourseName}"
     value = course_name if course_name else "<REMOVE>"
 
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
-                    if placeholder in paragraph.text:
-                        full_text = "".join(run.text for run in paragraph.runs)  # Get full text
-                        new_text = full_text.replace(placeholder, value)  # Replace placeholder
+    for paragraph in find_paragraphs(doc, placeholder, tables=True):
+        if placeholder in paragraph.text:
+            full_text = "".join(run.text for run in paragraph.runs)  # Get full text
+            new_text = full_text.replace(placeholder, value)  # Replace placeholder
 
-                        # Clear existing runs
-                        for run in paragraph.runs:
-                            run.text = ""
+            # Clear existing runs
+            for run in paragraph.runs:
+                run.text = ""
 
-                        # Insert new text while maintaining formatting
-                        if paragraph.runs:
-                            paragraph.runs[0].text = new_text
-                        return  # Stop after first replacement to prevent duplicates
+            # Insert new text while maintaining formatting
+            if paragraph.runs:
+                paragraph.runs[0].text = new_text
+            return  # Stop after first replacement to prevent duplicates
 
 
+@timed
 def replace_course_code_in_table(doc, course_code):
     """Finds and replaces {CourseCode} inside tables while maintaining formatting."""
     placeholder = "{CourseCode}"
     value = course_code if course_code else "<REMOVE>"
 
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
-                    if placeholder in paragraph.text:
-                        full_text = "".join(run.text for run in paragraph.runs)  # Get full text
-                        new_text = full_text.replace(placeholder, value)  # Replace placeholder
+    for paragraph in find_paragraphs(doc, placeholder, tables=True):
+        if placeholder in paragraph.text:
+            full_text = "".join(run.text for run in paragraph.runs)  # Get full text
+            new_text = full_text.replace(placeholder, value)  # Replace placeholder
 
-                        # Clear existing runs
-                        for run in paragraph.runs:
-                            run.text = ""
+            # Clear existing runs
+            for run in paragraph.runs:
+                run.text = ""
 
-                        # Insert new text while maintaining formatting
-                        if paragraph.runs:
-                            paragraph.runs[0].text = new_text
-                        return  # Stop after first replacement to prevent duplicates
+            # Insert new text while maintaining formatting
+            if paragraph.runs:
+                paragraph.runs[0].text = new_text
+            return  # Stop after first replacement to prevent duplicates
 
 
 
+@timed
 def replace_course_description(doc, course_description):
     """Replaces {CourseDescription} while maintaining formatting and indentation."""
     placeholder = "{CourseDescription}"
     value = course_description if course_description else "<REMOVE>"
     title = "COURSE DESCRIPTION" if course_description else "<REMOVE>"
 
-    for paragraph in doc.paragraphs:
+    for paragraph in find_paragraphs(doc, placeholder):
         if placeholder in paragraph.text:
             # Preserve original paragraph formatting
             paragraph_format = paragraph.paragraph_format  # Get original indentation
@@ -365,9 +1438,10 @@ def replace_course_description(doc, course_description):
 
 
 
+@timed
 def replace_youtube_references_with_formatting(doc, youtube_references):
     """Replaces {YouTubeReferences} placeholder in a DOCX file with formatted YouTube reference data."""
-    for paragraph in doc.paragraphs:
+    for paragraph in find_paragraphs(doc, "{YouTubeReferences}"):
         if "{YouTubeReferences}" in paragraph.text:
             p_element = paragraph._element  # Reference to remove placeholder
             parent = p_element.getparent()  # Get parent XML element
@@ -377,21 +1451,28 @@ def replace_youtube_references_with_formatting(doc, youtube_references):
             new_paragraph.style = paragraph_style
             parent.remove(p_element)  # Remove {YouTubeReferences} placeholder
 
-            for i, (youtube_title, youtube_desc, youtube_url) in enumerate(youtube_references, 1):
+            for i, video in enumerate(youtube_references, 1):
+                if i > 1:
+                    # ✅ Later videos are copies of the first with the text and link swapped
+                    p = stamp.stamp(new_paragraph._element, video.title, f" - {video.description}")
+                    p[stamp.runs[0]].find(qn("w:hyperlink")).set(qn("r:id"), video.url)
+                    continue
+
                 # Create a single paragraph for Title & Description
                 single_paragraph = new_paragraph.insert_paragraph_before("")
                 single_paragraph.style = paragraph_style
 
                 # Insert Video Title (Bold & Clickable)
-                title_run = single_paragraph.add_run(youtube_title)
+                title_run = single_paragraph.add_run(video.title)
                 title_run.bold = True
                 title_run.font.size = Pt(11)
-                make_hyperlink(title_run, youtube_url)  # Make title clickable
+                make_hyperlink(title_run, video.url)  # Make title clickable
 
                 # Append Description (Normal) immediately after Title
-                desc_run = single_paragraph.add_run(f" - {youtube_desc}")  
+                desc_run = single_paragraph.add_run(f" - {video.description}")  
                 desc_run.bold = False  # Ensure only title is bold
                 desc_run.font.size = Pt(11)
+                stamp = ParagraphStamp(single_paragraph._element)
 
             break  # Stop after replacing the first occurrence
 
@@ -402,13 +1483,14 @@ def make_hyperlink(run, url):
     run_element = run._r
     run_element.append(hyperlink)
 
+@timed
 def replace_prerequisites(doc, prerequisites):
     """Adds 'PREREQUISITES' title above {Prerequisites} while maintaining formatting."""
     placeholder = "{Prerequisites}"
     title = "PREREQUISITES"
     value = prerequisites.strip() if prerequisites else "<REMOVE>"
 
-    for paragraph in doc.paragraphs:
+    for paragraph in find_paragraphs(doc, placeholder):
         if placeholder in paragraph.text:
             p_element = paragraph._element  
             parent = p_element.getparent()
@@ -441,12 +1523,13 @@ def replace_prerequisites(doc, prerequisites):
   # Stop after processing the first occurrence
 
 
+@timed
 def replace_course_format(doc, course_format):
     """Adds 'COURSE FORMAT' title above {CourseFormat} while maintaining formatting."""
     placeholder = "{CourseFormat}"
     title = "COURSE FORMAT"
     value = course_format if course_format else "<REMOVE>"
-    for paragraph in doc.paragraphs:
+    for paragraph in find_paragraphs(doc, placeholder):
         if placeholder in paragraph.text:
             if not course_format.strip():
                 p_element = paragraph._element
@@ -479,6 +1562,7 @@ def replace_course_format(doc, course_format):
 
 
 
+@timed
 def replace_assessments_grading(doc, assessments_grading):
     """Adds 'ASSESSMENTS AND GRADING' title above {AssessmentsGrading} while maintaining formatting."""
     placeholder = "{AssessmentsGrading}"
@@ -486,7 +1570,7 @@ def replace_assessments_grading(doc, assessments_grading):
     value = assessments_grading if assessments_grading else "<REMOVE>"
 # Skip processing if there is no data
 
-    for paragraph in doc.paragraphs:
+    for paragraph in find_paragraphs(doc, placeholder):
         if placeholder in paragraph.text:
             if not assessments_grading.strip():
                 p_element = paragraph._element
@@ -521,7 +1605,7 @@ def replace_assessments_grading(doc, assessments_grading):
 
 def format_objectives(doc, placeholder, objectives):
     """Replaces {Objectives} with formatted course objectives while adding a title."""
-    for paragraph in doc.paragraphs:
+    for paragraph in find_paragraphs(doc, placeholder):
         if placeholder in paragraph.text:
             p_element = paragraph._element
             parent = p_element.getparent()
@@ -571,7 +1655,7 @@ def format_objectives(doc, placeholder, objectives):
 
 def format_textbooks(doc, placeholder, textbooks):
     """Replaces {Textbooks} with formatted textbook list while adding a title."""
-    for paragraph in doc.paragraphs:
+    for paragraph in find_paragraphs(doc, placeholder):
         if placeholder in paragraph.text:
             p_element = paragraph._element
             parent = p_element.getparent()
@@ -619,7 +1703,7 @@ def format_textbooks(doc, placeholder, textbooks):
 
 def format_references(doc, placeholder, references):
     """Replaces {References} with formatted reference list while adding a title."""
-    for paragraph in doc.paragraphs:
+    for paragraph in find_paragraphs(doc, placeholder):
         if placeholder in paragraph.text:
             p_element = paragraph._element
             parent = p_element.getparent()
@@ -669,9 +1753,10 @@ def format_references(doc, placeholder, references):
 
 
 
+@timed
 def format_course_outcomes(doc, placeholder, course_outcomes):
     """Replaces {CourseOutcomes} with formatted course outcomes while adding a title."""
-    for paragraph in doc.paragraphs:
+    for paragraph in find_paragraphs(doc, placeholder):
         if placeholder in paragraph.text:
             p_element = paragraph._element
             parent = p_element.getparent()
@@ -699,6 +1784,11 @@ def format_course_outcomes(doc, placeholder, course_outcomes):
 
             # ✅ Insert formatted COs **without adding an empty paragraph**
             for i, outcome in enumerate(course_outcomes, 1):
+                if i > 1:
+                    # ✅ Later COs are copies of the first with the text swapped
+                    stamp.stamp(paragraph._element, f"CO{i}      ", outcome)
+                    continue
+
                 co_paragraph = paragraph.insert_paragraph_before()  # ✅ Fix: No empty string inserted
                 co_paragraph.style = paragraph.style
 
@@ -718,13 +1808,15 @@ def format_course_outcomes(doc, placeholder, course_outcomes):
                 content_run = co_paragraph.add_run(outcome)
                 content_run.bold = False
                 content_run.font.size = Pt(11)
+                stamp = ParagraphStamp(co_paragraph._element)
 
             return  
         
 
+@timed
 def replace_units_with_formatting(doc, units):
     """Finds {Units} placeholder and inserts formatted units with proper indentation & normal content formatting."""
-    for paragraph in doc.paragraphs:
+    for paragraph in find_paragraphs(doc, "{Units}"):
         if "{Units}" in paragraph.text:
             p_element = paragraph._element  # Store reference to remove placeholder
             parent = p_element.getparent()  # Get parent XML element
@@ -734,11 +1826,18 @@ def replace_units_with_formatting(doc, units):
             new_paragraph.style = paragraph_style  # Apply the same style as the placeholder
             parent.remove(p_element)  # Remove {Units} placeholder
 
-            for i, (unit_title, unit_content, unit_periods) in enumerate(units, 1):
+            for i, unit in enumerate(units, 1):
+                title = f"UNIT {i}: {unit.title} (No. of Periods: {unit.periods})"
+                if i > 1:
+                    # ✅ Later units are copies of the first title/content pair with the text swapped
+                    title_stamp.stamp(new_paragraph._element, title)
+                    content_stamp.stamp(new_paragraph._element, f"{unit.content}")
+                    continue
+
                 # Insert Unit Title (Bold) with correct style
                 title_paragraph = new_paragraph.insert_paragraph_before("")
                 title_paragraph.style = paragraph_style  # Apply same style
-                title_run = title_paragraph.add_run(f"UNIT {i}: {unit_title} (No. of Periods: {unit_periods})")
+                title_run = title_paragraph.add_run(title)
                 title_paragraph.paragraph_format.space_before = Pt(12)  # 🔥 Space before title
                 title_paragraph.paragraph_format.space_after = Pt(10)  
                 title_run.bold = True
@@ -747,18 +1846,21 @@ def replace_units_with_formatting(doc, units):
                 # Insert Unit Content (Normal) with correct indentation
                 content_paragraph = new_paragraph.insert_paragraph_before("")
                 content_paragraph.style = paragraph_style  # Apply same style  
-                content_run = content_paragraph.add_run(f"{unit_content}")
+                content_run = content_paragraph.add_run(f"{unit.content}")
                 content_run.bold = False  # 🔥 Fix: Ensure normal text
                 content_run.font.size = Pt(11)
+                title_stamp = ParagraphStamp(title_paragraph._element)
+                content_stamp = ParagraphStamp(content_paragraph._element)
 
             break 
 
+@timed
 def replace_practical_periods(doc, practical_periods):
     """Replaces {PracticalPeriods} with a single-line format while maintaining formatting."""
     placeholder = "{PracticalPeriods}"
     value = f"PRACTICAL PERIODS: {practical_periods}" if practical_periods else "<REMOVE>"
 
-    for paragraph in doc.paragraphs:
+    for paragraph in find_paragraphs(doc, placeholder):
         if placeholder in paragraph.text:
             # ✅ Replace the placeholder with formatted single-line text
             for run in paragraph.runs:
@@ -773,15 +1875,13 @@ def replace_practical_periods(doc, practical_periods):
             return  # ✅ Stop after first occurrence
 
 
-def replace_total_periods(doc, units):
-    """Calculates total periods from all units and replaces {TotalPeriods} in a single line."""
+@timed
+def replace_total_periods(doc, total_periods):
+    """Replaces {TotalPeriods} with the course's total periods (Course.total_periods) in a single line."""
     placeholder = "{TotalPeriods}"
-
-    # ✅ Calculate total periods by summing unit periods
-    total_periods = sum(unit[2] for unit in units) if units else 0
     value = f"TOTAL NUMBER OF PERIODS: {total_periods}" if total_periods > 0 else "<REMOVE>"
 
-    for paragraph in doc.paragraphs:
+    for paragraph in find_paragraphs(doc, placeholder):
         if placeholder in paragraph.text:
             # ✅ Combine all runs text (handles cases where {TotalPeriods} is split across runs)
             full_text = "".join(run.text for run in paragraph.runs)
@@ -807,7 +1907,7 @@ def replace_list_of_experiments(doc, placeholder, experiments):
     - `placeholder`: The placeholder text to replace (e.g., {ListOfExperiments})
     - `experiments`: The list of experiments to insert
     """
-    for paragraph in doc.paragraphs:
+    for paragraph in find_paragraphs(doc, placeholder):
         if placeholder in paragraph.text:
             parent = paragraph._element.getparent()
 
@@ -849,5 +1949,116 @@ def replace_list_of_experiments(doc, placeholder, experiments):
 
             return  # ✅ Stop after first occurrence
 
+# Production defaults; override with SYLLABUS_* environment variables
+# (e.g. SYLLABUS_PRELOAD_TEMPLATE=false) or the `config` argument of create_app()
+DEFAULT_CONFIG = {
+    "DEBUG": False,
+    "TESTING": False,
+    "PROPAGATE_EXCEPTIONS": False,
+    "TEMPLATES_AUTO_RELOAD": False,
+    "SEND_FILE_MAX_AGE_DEFAULT": 3600,  # Static files (script.js, styles.css) cached for an hour
+    "MAX_CONTENT_LENGTH": 2 * 1024 * 1024,  # Request bodies; /generate/batch allows BATCH_MAX_BYTES
+    "PRELOAD_TEMPLATE": True,
+    "TRUSTED_PROXIES": 0,  # Reverse proxies in front of the app whose X-Forwarded-For is believed
+    # The page's form submits through /jobs and polls for the result. Jobs are kept in one
+    # process's memory, so only turn this on when a single process serves the app.
+    "ASYNC_FORM": False,
+}
+
+
+# What this process spent before it could serve, filled in by create_app():
+# module load (mostly importing Flask), template warm-up, and where each template came from
+STARTUP = {}
+
+
+def create_app(config=None):
+    """
+    Builds the Flask app. With PRELOAD_TEMPLATE the template is parsed and compiled here,
+    so under `gunicorn --preload` it happens once in the master instead of in every worker.
+    """
+    started = time.perf_counter()
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    app.config.from_prefixed_env("SYLLABUS")
+    if config:
+        app.config.update(config)
+    app.register_blueprint(bp)
+    if app.config["TRUSTED_PROXIES"]:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["TRUSTED_PROXIES"])
+
+    if not logger.handlers:
+        logger.addHandler(default_handler)
+    if app.config["PRELOAD_TEMPLATE"]:
+        warm_up()
+
+    if not STARTUP:  # Only the first app built in a process reports its startup
+        STARTUP.update(
+            import_ms=round((started - _import_started) * 1000, 1),
+            warm_up_ms=round((time.perf_counter() - started) * 1000, 1),
+            templates={template_id: startup_source(template_id) for template_id in templates.ids()},
+        )
+        logger.info("Startup: %s", json.dumps(STARTUP))
+    return app
+
+
+def startup_source(template_id):
+    """How a template got into memory: "prebuilt" snapshot, "parsed" from the .docx, or "not loaded"."""
+    template = templates.current(template_id)
+    if template is None:
+        return "not loaded"
+    return "prebuilt" if template.from_prebuilt else "parsed"
+
+
+@bp.cli.command("prebuild")
+def prebuild_command():
+    """
+    Compiles every template into TEMPLATE_SNAPSHOT_DIR, e.g. while building an image:
+    TEMPLATE_SNAPSHOT_DIR=/srv/snapshots flask --app app syllabus prebuild
+    """
+    if not TEMPLATE_SNAPSHOT_DIR:
+        raise SystemExit("TEMPLATE_SNAPSHOT_DIR is not set")
+    warm_up()
+    for template_id in templates.ids():
+        template = templates.current(template_id)
+        if template is not None:
+            print(f"{template_id}: {startup_source(template_id)}, {template.prebuilt[0]}")
+
+
+@bp.cli.command("index")
+@click.argument("files", nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option("--api", is_flag=True, help="The files hold /api/v1/syllabus documents, not form records.")
+@click.option("--template", "template_id", default=DEFAULT_TEMPLATE, show_default=True,
+              help="Template id recorded for the loaded courses.")
+def index_command(files, api, template_id):
+    """
+    Loads JSON Lines courses (e.g. from import_syllabi.py) into the course store, then
+    rebuilds its search index. With no files, only rebuilds the index.
+    """
+    store = get_course_store()
+    if store is None:
+        raise SystemExit("COURSE_STORE_PATH is not set")
+
+    def read(path):
+        with open(path, encoding="utf-8-sig") as f:
+            for n, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    if api:
+                        yield read_course_json(json.loads(line))
+                    else:
+                        yield from map(read_course_form, parse_course_records(line, "jsonl"))
+                except ValueError as e:  # Includes CourseValidationError
+                    print(f"{path}:{n}: skipped ({e})", file=sys.stderr)
+
+    started = time.perf_counter()
+    loaded = sum(store.save_many(read(path), template_id) for path in files)
+    store.rebuild_index()
+    print(f"Loaded {loaded} courses; {store.count()} stored and indexed "
+          f"in {time.perf_counter() - started:.1f}s")
+
+
+app = create_app()
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,357 @@
+"""
+Benchmarks the /generate pipeline with realistic course payloads.
+
+    python benchmark.py                          # all payloads, print a report
+    python benchmark.py --save before.json       # keep the numbers
+    python benchmark.py --compare before.json    # flag phases that got slower
+    python benchmark.py --cold-start 10 small    # also time 10 fresh processes to their first response
+
+Each payload is run through:
+- the Flask test client (end-to-end latency percentiles and throughput; output cache off)
+- the pipeline phases one by one: template load, cleaning, render plan, each legacy
+  replace_* function, and packaging (streamed and buffered)
+With --cold-start, new interpreter processes are timed from launch to their first
+response, once parsing the templates and once loading prebuilt template snapshots.
+"""
+import argparse
+import dataclasses
+import functools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from werkzeug.datastructures import MultiDict
+
+import app as syllabus
+from template_cache import TemplateSnapshot
+
+LOREM = (
+    "The initial step of setting up a development environment is choosing the appropriate "
+    "tool to complete the application setup. This application requires a Linux environment, "
+    "specifically Ubuntu. "
+)
+
+# Text as it arrives when copied out of a PDF: hard line breaks mid-sentence,
+# runs of spaces, numbered and bulleted lines, tabs and non-breaking spaces
+PDF_PASTE = (
+    "1.Introduction to sets,  relations\nand functions – basic\tdefinitions\n"
+    "   continued on the next line.\n"
+    "•Partial orders and\n  lattices  (Hasse diagrams)\n"
+    "-Boolean algebra , \n\n   minimisation using K-maps\r\n"
+)
+
+
+def course_payload(units=5, unit_text=LOREM * 3, references=5, textbooks=3, videos=2,
+                   objectives=5, outcomes=5, experiments=0):
+    """Returns form data shaped like index.html's submit."""
+    form = MultiDict([
+        ("Semester", "4"),
+        ("CourseName", "DISCRETE MATHEMATICS"),
+        ("CourseCode", "MA3401"),
+        ("CourseDescription", LOREM * 4),
+        ("Prerequisites", LOREM),
+        ("AssessmentsGrading", LOREM * 2),
+        ("courseformat", LOREM),
+    ])
+    if experiments:
+        form.add("hasPractical", "on")
+        form.add("practical_periods", "30")
+    for i in range(1, objectives + 1):
+        form.add("objective", f"To familiarize the applications of algebraic structures ({i}).")
+    for i in range(1, experiments + 1):
+        form.add("experiments", f"Experiment {i}: implement and measure algorithm {i}.")
+    for i in range(1, outcomes + 1):
+        form.add("course_outcome", f"Apply the concepts of unit {i} to solve problems.")
+    for i in range(1, textbooks + 1):
+        form.add("textbook", f"Kenneth H. Rosen, “Discrete Mathematics and Its Applications”, {i}th ed.")
+    for i in range(1, references + 1):
+        form.add("reference", f"{i}.J. A. Bondy and U. S. R. Murty, “Graph Theory”, Springer, {2000 + i}.")
+    for i in range(1, units + 1):
+        form.add(f"unit_title_{i}", f"UNIT {i} – SETS AND ALGEBRAIC STRUCTURES")
+        form.add(f"unit_content_{i}", unit_text)
+        form.add(f"unit_periods_{i}", "9")
+    for i in range(1, videos + 1):
+        form.add(f"youtube_title_{i}", f"Lecture {i}")
+        form.add(f"youtube_desc_{i}", f"Recorded lecture {i} on discrete structures")
+        form.add(f"youtube_url_{i}", f"https://www.youtube.com/watch?v=lecture{i:04d}")
+    return form
+
+
+PAYLOADS = {
+    "small": lambda: course_payload(units=1, references=1, textbooks=1, videos=0,
+                                    objectives=1, outcomes=1),
+    "typical": lambda: course_payload(),
+    "units-30": lambda: course_payload(units=30),
+    "pdf-paste": lambda: course_payload(units=5, unit_text=PDF_PASTE * 100),  # LONG_TEXT, the most allowed
+    "references-50": lambda: course_payload(references=50, textbooks=20),
+    "videos-40": lambda: course_payload(videos=40),
+    "worst": lambda: course_payload(units=30, unit_text=PDF_PASTE * 50, references=50,
+                                    textbooks=20, videos=40, objectives=20, outcomes=20,
+                                    experiments=20),
+}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+class PhaseTimer:
+    """
+    Collects seconds per phase name over many runs. Wrapped functions add up within a
+    run (replace_list_section is called once per list) and count as one sample per run.
+    """
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self._run = defaultdict(float)
+
+    def add(self, name, seconds):
+        self.samples[name].append(seconds)
+
+    def wrap(self, name, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._run[name] += time.perf_counter() - start
+        return wrapper
+
+    def end_run(self):
+        for name, seconds in self._run.items():
+            self.add(name, seconds)
+        self._run.clear()
+
+    def summary(self):
+        return {name: statistics.median(values) * 1000 for name, values in self.samples.items()}
+
+
+def bench_requests(client, form, iterations):
+    """End-to-end POST /generate; returns latency stats in ms and requests per second."""
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        with client.post("/generate", data=form) as response:
+            response.get_data()  # Drain the streamed body
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"/generate returned {response.status_code}: {response.get_data()[:200]!r}")
+    elapsed = time.perf_counter() - started
+    return {
+        "p50": percentile(latencies, 50),
+        "p90": percentile(latencies, 90),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies),
+        "rps": iterations / elapsed,
+    }
+
+
+def bench_preview(client, form, iterations):
+    """Median ms of POST /preview, the live preview script.js requests while the form is edited."""
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        with client.post("/preview", data=form) as response:
+            response.get_data()
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"/preview returned {response.status_code}: {response.get_data()[:200]!r}")
+    return statistics.median(latencies)
+
+
+def bench_phases(form, iterations):
+    """Times each pipeline phase separately; returns {phase: median ms}."""
+    timer = PhaseTimer()
+    path = syllabus.templates.cache().path
+    with open(path, "rb") as f:
+        raw = f.read()
+
+    for _ in range(iterations):
+        # Cold load: what the first request after a template edit pays
+        stat = os.stat(path)
+        _, seconds = timed(TemplateSnapshot, path, (stat.st_mtime_ns, stat.st_size), raw)
+        timer.add("template load (cold)", seconds)
+        fresh = TemplateSnapshot(path, (stat.st_mtime_ns, stat.st_size), raw)
+        _, seconds = timed(syllabus.get_render_plan, fresh)
+        timer.add("compile render plan", seconds)
+    template = syllabus.templates.snapshot()
+    for _ in range(iterations):
+        _, seconds = timed(syllabus.templates.snapshot)
+        timer.add("template load (cached)", seconds)
+
+    for _ in range(iterations):
+        course, seconds = timed(syllabus.read_course_form, form)
+        timer.add("clean form", seconds)
+
+    plan = syllabus.get_render_plan(template)
+    if plan is not None:
+        sections, plan.sections = plan.sections, None  # Full renders first, without the section cache
+        try:
+            for _ in range(iterations):
+                document_xml, seconds = timed(syllabus.render_course_data, template, course)
+                timer.add("render (plan)", seconds)
+        finally:
+            plan.sections = sections
+        if sections is not None:
+            # Re-submitting after editing one section: only that section is rendered again
+            syllabus.render_course_data(template, course)
+            for n in range(iterations):
+                edited = dataclasses.replace(course, course_outcomes=course.course_outcomes + (f"Edit {n}",))
+                _, seconds = timed(syllabus.render_course_data, template, edited)
+                timer.add("render (plan, one section edited)", seconds)
+
+    # Legacy python-docx path on a private snapshot, timing every replace_* call
+    legacy = TemplateSnapshot(template.path, template.stamp, template.raw)
+    legacy.plan = False
+    names = [name for name in dir(syllabus) if name.startswith(("replace_", "format_"))]
+    originals = {name: getattr(syllabus, name) for name in names}
+    try:
+        for name in names:
+            setattr(syllabus, name, timer.wrap(f"  {name}", originals[name]))
+        legacy.new_document = timer.wrap("  new_document", legacy.new_document)
+        for _ in range(iterations):
+            legacy_xml, seconds = timed(syllabus.render_course_data, legacy, course)
+            timer.add("render (python-docx)", seconds)
+            timer.end_run()
+    finally:
+        for name, fn in originals.items():
+            setattr(syllabus, name, fn)
+
+    if syllabus.get_render_plan(template) is None:
+        document_xml = legacy_xml
+    for _ in range(iterations):
+        _, seconds = timed(lambda: b"".join(template.iter_docx(document_xml)))
+        timer.add("package (streamed)", seconds)
+        _, seconds = timed(template.build_docx, document_xml)
+        timer.add("package (buffered)", seconds)
+    return timer.summary()
+
+
+# Run in a fresh interpreter: import the app (which warms the templates) and answer one request
+COLD_START_SCRIPT = """
+import json, time
+import app
+client = app.app.test_client()
+start = time.perf_counter()
+client.post("/generate", data={"CourseName": "Cold start"})
+print(json.dumps(dict(app.STARTUP, first_request_ms=(time.perf_counter() - start) * 1000)))
+"""
+
+
+def bench_cold_start(runs):
+    """Times fresh processes to their first response; returns {"phases": {phase: median ms}}."""
+    phases = defaultdict(list)
+    base_env = {key: value for key, value in os.environ.items()
+                if key not in ("TEMPLATE_SNAPSHOT_DIR", "OUTPUT_CACHE_DIR", "SYLLABUS_PRELOAD_TEMPLATE")}
+    with tempfile.TemporaryDirectory() as snapshots:
+        for mode, env in (("parse", base_env), ("prebuilt", dict(base_env, TEMPLATE_SNAPSHOT_DIR=snapshots))):
+            if mode == "prebuilt":  # The first process writes the snapshots
+                subprocess.run([sys.executable, "-c", COLD_START_SCRIPT], env=env, check=True,
+                               capture_output=True, cwd=syllabus.BASE_DIR)
+            for _ in range(runs):
+                start = time.perf_counter()
+                done = subprocess.run([sys.executable, "-c", COLD_START_SCRIPT], env=env, check=True,
+                                      capture_output=True, text=True, cwd=syllabus.BASE_DIR)
+                phases[f"cold start ({mode}): launch to first response"].append(
+                    (time.perf_counter() - start) * 1000)
+                startup = json.loads(done.stdout.splitlines()[-1])
+                phases[f"  {mode}: import app"].append(startup["import_ms"])
+                phases[f"  {mode}: template warm-up"].append(startup["warm_up_ms"])
+                phases[f"  {mode}: first request"].append(startup["first_request_ms"])
+    return {"phases": {phase: statistics.median(times) for phase, times in phases.items()}}
+
+
+def run(names, iterations):
+    syllabus.output_cache = None  # Measure rendering, not cache hits
+    syllabus.rate_limiter = None  # Every request comes from the same client
+    syllabus.COURSE_STORE_PATH = ""  # Don't fill a configured course store with benchmark courses
+    client = syllabus.app.test_client()
+    client.post("/generate", data=PAYLOADS["typical"]()).close()  # Warm the template and plan
+    results = {}
+    for name in names:
+        form = PAYLOADS[name]()
+        results[name] = {
+            "requests": bench_requests(client, form, iterations),
+            "phases": bench_phases(form, max(3, iterations // 5)),
+        }
+        results[name]["phases"]["preview (POST /preview)"] = bench_preview(client, form, iterations)
+    return results
+
+
+def report(results, baseline=None, threshold=0.2):
+    """Prints results; with a baseline, marks phases more than `threshold` slower. Returns regressions."""
+    regressions = []
+    for name, result in results.items():
+        before = (baseline or {}).get(name, {})
+        req = result.get("requests")
+        if req is None:
+            print(f"\n== {name}")
+            rows = []
+        else:
+            print(f"\n== {name}: p50 {req['p50']:.2f} ms  p90 {req['p90']:.2f} ms  "
+                  f"p99 {req['p99']:.2f} ms  max {req['max']:.2f} ms  {req['rps']:.0f} req/s")
+            rows = [("request p50", req["p50"], before.get("requests", {}).get("p50"))]
+        rows += [(phase, ms, before.get("phases", {}).get(phase)) for phase, ms in result["phases"].items()]
+        for phase, ms, old in rows:
+            line = f"  {phase:<48} {ms:9.3f} ms"
+            if old:
+                change = (ms - old) / old
+                line += f"  ({change:+.0%} vs {old:.3f} ms)"
+                # Ignore sub-0.05 ms phases; their noise swamps any real change
+                if change > threshold and ms - old > 0.05:
+                    line += "  << slower"
+                    regressions.append((name, phase))
+            print(line)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("payloads", nargs="*", metavar="PAYLOAD",
+                        help=f"payloads to run: {', '.join(PAYLOADS)} (default: all)")
+    parser.add_argument("-n", "--iterations", type=int, default=50, help="requests per payload")
+    parser.add_argument("--save", metavar="FILE", help="write results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="compare against results saved earlier")
+    parser.add_argument("--cold-start", type=int, default=0, metavar="RUNS",
+                        help="also time RUNS fresh processes from launch to first response")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown reported as a regression (default 0.2)")
+    args = parser.parse_args(argv)
+    unknown = set(args.payloads) - set(PAYLOADS)
+    if unknown:
+        parser.error(f"unknown payload(s): {', '.join(sorted(unknown))}")
+
+    results = run(args.payloads or list(PAYLOADS), args.iterations)
+    if args.cold_start:
+        results["cold-start"] = bench_cold_start(args.cold_start)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    regressions = report(results, baseline, args.threshold)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if regressions:
+        print(f"\n{len(regressions)} phase(s) slower than {args.compare}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+from dataclasses import dataclass, field
+
+
+@dataclass(frozen=True, slots=True)
+class Unit:
+    title: str
+    content: str
+    periods: int
+
+
+@dataclass(frozen=True, slots=True)
+class VideoRef:
+    title: str
+    description: str
+    url: str
+
+
+@dataclass(frozen=True, slots=True)
+class Course:
+    """
+    One course's cleaned content, built once per input (form, JSON document or batch record)
+    and shared by rendering, the output cache key and the render pool.
+    Text is already cleaned; blank list items and incomplete units/videos are already dropped.
+    """
+
+    semester: str = ""
+    course_name: str = ""
+    course_code: str = ""
+    course_description: str = ""
+    prerequisites: str = ""
+    course_format: str = ""
+    assessments_grading: str = ""
+    practical_periods: str = ""  # Empty when the course has no practical component
+    objectives: tuple[str, ...] = ()
+    experiments: tuple[str, ...] = ()
+    course_outcomes: tuple[str, ...] = ()
+    textbooks: tuple[str, ...] = ()
+    references: tuple[str, ...] = ()
+    units: tuple[Unit, ...] = ()
+    youtube_references: tuple[VideoRef, ...] = ()
+    total_periods: int = field(init=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "total_periods", sum(unit.periods for unit in self.units))
+
+    def key_data(self):
+        """Returns the content as JSON-friendly nested lists, in field order (for cache keys)."""
+        return [
+            self.semester, self.course_name, self.course_code, self.course_description,
+            self.prerequisites, self.course_format, self.assessments_grading, self.practical_periods,
+            self.objectives, self.experiments, self.course_outcomes, self.textbooks, self.references,
+            [(unit.title, unit.content, unit.periods) for unit in self.units],
+            [(video.title, video.description, video.url) for video in self.youtube_references],
+        ]
+
+    def as_document(self):
+        """Returns the content as a course_schema document (what /api/v1/syllabus accepts)."""
+        return {
+            "semester": self.semester,
+            "course_name": self.course_name,
+            "course_code": self.course_code,
+            "course_description": self.course_description,
+            "prerequisites": self.prerequisites,
+            "course_format": self.course_format,
+            "assessments_grading": self.assessments_grading,
+            "practical_periods": self.practical_periods,
+            "objectives": list(self.objectives),
+            "experiments": list(self.experiments),
+            "course_outcomes": list(self.course_outcomes),
+            "textbooks": list(self.textbooks),
+            "references": list(self.references),
+            "units": [{"title": unit.title, "content": unit.content, "periods": unit.periods}
+                      for unit in self.units],
+            "youtube_references": [{"title": video.title, "description": video.description, "url": video.url}
+                                   for video in self.youtube_references],
+        }
@@ -0,0 +1,195 @@
+"""
+Schema for the JSON syllabus API. A request document looks like:
+
+    {
+      "semester": "4", "course_name": "DISCRETE MATHEMATICS", "course_code": "MA3401",
+      "course_description": "...", "prerequisites": "...", "course_format": "...",
+      "assessments_grading": "...", "practical_periods": 30,
+      "objectives": ["..."], "experiments": ["..."], "course_outcomes": ["..."],
+      "textbooks": ["..."], "references": ["..."],
+      "units": [{"title": "...", "content": "...", "periods": 9}],
+      "youtube_references": [{"title": "...", "description": "...", "url": "https://..."}]
+    }
+
+Every field is optional; unknown fields are rejected so typos don't silently drop content.
+"""
+
+SHORT_TEXT = 300  # Characters allowed in names, codes and titles
+LONG_TEXT = 20_000  # Characters allowed in descriptions and unit content
+MAX_LIST_ITEMS = 100
+MAX_UNITS = 50
+MAX_VIDEOS = 100
+MAX_PERIODS = 10_000
+
+SCALAR_FIELDS = {
+    "semester": SHORT_TEXT,
+    "course_name": SHORT_TEXT,
+    "course_code": SHORT_TEXT,
+    "course_description": LONG_TEXT,
+    "prerequisites": LONG_TEXT,
+    "course_format": LONG_TEXT,
+    "assessments_grading": LONG_TEXT,
+}
+LIST_FIELDS = ("objectives", "experiments", "course_outcomes", "textbooks", "references")
+UNIT_FIELDS = {"title": SHORT_TEXT, "content": LONG_TEXT, "periods": None}
+VIDEO_FIELDS = {"title": SHORT_TEXT, "description": LONG_TEXT, "url": 2_000}
+
+KNOWN_FIELDS = set(SCALAR_FIELDS) | set(LIST_FIELDS) | {"practical_periods", "units", "youtube_references"}
+
+
+class CourseValidationError(ValueError):
+    """Raised with every problem found in a document; `errors` is a list of "path: message"."""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+def _text(value, path, max_length, errors, required=False):
+    if value is None:
+        if required:
+            errors.append(f"{path}: is required")
+        return ""
+    if not isinstance(value, str):
+        errors.append(f"{path}: must be a string")
+        return ""
+    if len(value) > max_length:
+        errors.append(f"{path}: longer than {max_length} characters")
+        return ""
+    if required and not value.strip():
+        errors.append(f"{path}: must not be empty")
+    return value
+
+
+def _periods(value, path, errors):
+    if value is None:
+        return 0
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= MAX_PERIODS:
+        errors.append(f"{path}: must be an integer from 0 to {MAX_PERIODS}")
+        return 0
+    return value
+
+
+def _array(value, path, max_items, errors):
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        errors.append(f"{path}: must be an array")
+        return []
+    if len(value) > max_items:
+        errors.append(f"{path}: more than {max_items} items")
+        return []
+    return value
+
+
+def _object(value, path, fields, errors):
+    if not isinstance(value, dict):
+        errors.append(f"{path}: must be an object")
+        return None
+    for name in sorted(set(value) - set(fields)):
+        errors.append(f"{path}.{name}: unknown field")
+    return value
+
+
+def validate_course(document):
+    """
+    Checks a decoded JSON document against the schema above.
+    Returns it with defaults filled in, or raises CourseValidationError listing every problem.
+    """
+    errors = []
+    if not isinstance(document, dict):
+        raise CourseValidationError(["$: must be a JSON object"])
+    for name in sorted(set(document) - KNOWN_FIELDS):
+        errors.append(f"{name}: unknown field")
+
+    course = {name: _text(document.get(name), name, limit, errors) for name, limit in SCALAR_FIELDS.items()}
+
+    for name in LIST_FIELDS:
+        items = _array(document.get(name), name, MAX_LIST_ITEMS, errors)
+        # Blank items are dropped later, as blank form inputs are
+        course[name] = [_text(item, f"{name}[{i}]", LONG_TEXT, errors) for i, item in enumerate(items)]
+
+    practical = document.get("practical_periods")
+    if practical is not None and not isinstance(practical, str):
+        practical = _periods(practical, "practical_periods", errors)
+        course["practical_periods"] = str(practical) if practical else ""
+    else:
+        course["practical_periods"] = _text(practical, "practical_periods", SHORT_TEXT, errors)
+
+    course["units"] = []
+    for i, unit in enumerate(_array(document.get("units"), "units", MAX_UNITS, errors)):
+        path = f"units[{i}]"
+        if _object(unit, path, UNIT_FIELDS, errors) is not None:
+            course["units"].append({
+                "title": _text(unit.get("title"), f"{path}.title", SHORT_TEXT, errors, required=True),
+                "content": _text(unit.get("content"), f"{path}.content", LONG_TEXT, errors, required=True),
+                "periods": _periods(unit.get("periods"), f"{path}.periods", errors),
+            })
+
+    course["youtube_references"] = []
+    videos = _array(document.get("youtube_references"), "youtube_references", MAX_VIDEOS, errors)
+    for i, video in enumerate(videos):
+        path = f"youtube_references[{i}]"
+        if _object(video, path, VIDEO_FIELDS, errors) is not None:
+            course["youtube_references"].append({
+                name: _text(video.get(name), f"{path}.{name}", limit, errors, required=True)
+                for name, limit in VIDEO_FIELDS.items()
+            })
+
+    if errors:
+        raise CourseValidationError(errors)
+    return course
+
+
+# The same limits for index.html's form fields (/generate, /jobs and batch records)
+FORM_SCALAR_FIELDS = {
+    "Semester": SHORT_TEXT,
+    "CourseName": SHORT_TEXT,
+    "CourseCode": SHORT_TEXT,
+    "CourseDescription": LONG_TEXT,
+    "Prerequisites": LONG_TEXT,
+    "courseformat": LONG_TEXT,
+    "AssessmentsGrading": LONG_TEXT,
+    "practical_periods": SHORT_TEXT,
+}
+FORM_LIST_FIELDS = ("objective", "experiments", "course_outcome", "textbook", "reference")
+FORM_NUMBERED_FIELDS = {  # `unit_title_1`, `unit_title_2`, ...: prefix → (character limit, highest number)
+    "unit_title": (SHORT_TEXT, MAX_UNITS),
+    "unit_content": (LONG_TEXT, MAX_UNITS),
+    "unit_periods": (SHORT_TEXT, MAX_UNITS),
+    "youtube_title": (SHORT_TEXT, MAX_VIDEOS),
+    "youtube_desc": (LONG_TEXT, MAX_VIDEOS),
+    "youtube_url": (VIDEO_FIELDS["url"], MAX_VIDEOS),
+}
+
+
+def check_course_form(form):
+    """
+    Checks form-like course data (anything with `.keys()` and `.getlist()`) against the
+    schema's size limits, before any of it is cleaned or rendered. Unknown fields are
+    ignored, as read_course_form() ignores them. Raises CourseValidationError.
+    """
+    errors = []
+    for key in form.keys():
+        values = form.getlist(key)
+        prefix, _, number = key.rpartition("_")
+        if key in FORM_SCALAR_FIELDS:
+            limit = FORM_SCALAR_FIELDS[key]
+        elif key in FORM_LIST_FIELDS:
+            limit = LONG_TEXT
+            if len(values) > MAX_LIST_ITEMS:
+                errors.append(f"{key}: more than {MAX_LIST_ITEMS} items")
+                continue
+        elif prefix in FORM_NUMBERED_FIELDS and number.isdigit():
+            limit, highest = FORM_NUMBERED_FIELDS[prefix]
+            if int(number) > highest:
+                errors.append(f"{key}: at most {highest} are allowed")
+                continue
+        else:
+            continue
+        for value in values:
+            if len(value) > limit:
+                errors.append(f"{key}: longer than {limit} characters")
+                break
+    if errors:
+        raise CourseValidationError(errors)
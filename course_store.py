@@ -0,0 +1,258 @@
+import hashlib
+import json
+import logging
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# One row per course (same code and name → same row, latest content wins). The search
+# index is an external-content FTS5 table over the row's text columns, kept in step by
+# triggers; it is only rewritten when a course's content actually changes.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS courses (
+    id INTEGER PRIMARY KEY,
+    identity TEXT NOT NULL UNIQUE,
+    content_key TEXT NOT NULL,
+    course_code TEXT NOT NULL,
+    course_name TEXT NOT NULL,
+    semester TEXT NOT NULL,
+    template TEXT NOT NULL,
+    document TEXT NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    units TEXT NOT NULL,
+    outcomes TEXT NOT NULL,
+    refs TEXT NOT NULL,
+    generated INTEGER NOT NULL DEFAULT 1,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS course_index USING fts5(
+    title, description, units, outcomes, refs,
+    content='courses', content_rowid='id', tokenize='porter unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS courses_insert AFTER INSERT ON courses BEGIN
+    INSERT INTO course_index(rowid, title, description, units, outcomes, refs)
+    VALUES (new.id, new.title, new.description, new.units, new.outcomes, new.refs);
+END;
+CREATE TRIGGER IF NOT EXISTS courses_delete AFTER DELETE ON courses BEGIN
+    INSERT INTO course_index(course_index, rowid, title, description, units, outcomes, refs)
+    VALUES ('delete', old.id, old.title, old.description, old.units, old.outcomes, old.refs);
+END;
+CREATE TRIGGER IF NOT EXISTS courses_update AFTER UPDATE ON courses
+WHEN old.content_key IS NOT new.content_key BEGIN
+    INSERT INTO course_index(course_index, rowid, title, description, units, outcomes, refs)
+    VALUES ('delete', old.id, old.title, old.description, old.units, old.outcomes, old.refs);
+    INSERT INTO course_index(rowid, title, description, units, outcomes, refs)
+    VALUES (new.id, new.title, new.description, new.units, new.outcomes, new.refs);
+END;
+"""
+
+_UPSERT = """
+INSERT INTO courses (identity, content_key, course_code, course_name, semester, template, document,
+                     title, description, units, outcomes, refs, created, updated)
+VALUES (:identity, :content_key, :course_code, :course_name, :semester, :template, :document,
+        :title, :description, :units, :outcomes, :refs, :now, :now)
+ON CONFLICT (identity) DO UPDATE SET
+    content_key = excluded.content_key, course_code = excluded.course_code,
+    course_name = excluded.course_name, semester = excluded.semester, template = excluded.template,
+    document = excluded.document, title = excluded.title, description = excluded.description,
+    units = excluded.units, outcomes = excluded.outcomes, refs = excluded.refs,
+    generated = generated + 1, updated = excluded.updated
+"""
+
+# bm25() weights per indexed column: a hit in the code or name counts most
+_RANK = "bm25(course_index, 10.0, 1.0, 2.0, 2.0, 3.0)"
+
+_TERM_RE = re.compile(r'"([^"]*)"|(\S+)')
+_WORD_RE = re.compile(r"\w+")
+
+WRITE_BATCH = 500  # Rows per transaction in the background writer
+
+
+def match_expression(query):
+    """
+    Turns a search box query into an FTS5 MATCH expression: every word or "quoted phrase"
+    must appear, and a trailing `*` makes a word a prefix. Punctuation is dropped, so user
+    input can't produce an FTS5 syntax error. Returns "" when nothing searchable is left.
+    """
+    terms = []
+    for phrase, word in _TERM_RE.findall(query):
+        words = _WORD_RE.findall(phrase or word)
+        if words:
+            prefix = "*" if word.endswith("*") and len(words) == 1 else ""
+            terms.append('"' + " ".join(words) + '"' + prefix)
+    return " ".join(terms)
+
+
+def course_row(course, template_id, now):
+    """The column values stored for one Course."""
+    key_data = json.dumps(course.key_data(), ensure_ascii=False, separators=(",", ":"))
+    content_key = hashlib.sha256(key_data.encode("utf-8")).hexdigest()
+    code, name = course.course_code.strip(), course.course_name.strip()
+    # Courses without a code or name can't be told apart from their edits; keep each version
+    identity = f"{code.lower()}\n{name.lower()}" if code or name else content_key
+    return {
+        "identity": identity,
+        "content_key": content_key,
+        "course_code": code,
+        "course_name": name,
+        "semester": course.semester,
+        "template": template_id,
+        "document": json.dumps(course.as_document(), ensure_ascii=False, separators=(",", ":")),
+        "title": f"{code}\n{name}",
+        "description": "\n".join((course.course_description, course.prerequisites,
+                                  course.course_format, course.assessments_grading)),
+        "units": "\n".join([f"{unit.title}\n{unit.content}" for unit in course.units] + list(course.experiments)),
+        "outcomes": "\n".join(course.objectives + course.course_outcomes),
+        "refs": "\n".join(course.textbooks + course.references
+                          + tuple(f"{video.title}\n{video.description}" for video in course.youtube_references)),
+        "now": now,
+    }
+
+
+class CourseStore:
+    """
+    Generated courses in a SQLite database, with a full-text index for search.
+    - `path`: the database file (created on first use; WAL mode, so several processes can share it)
+    - `max_pending`: courses queued for the writer; beyond that save() drops the course and logs it
+    save() only queues the course: a background thread writes queued courses in batches, so
+    generation never waits on the disk. Searches read on a connection per thread.
+    """
+
+    def __init__(self, path, max_pending=10_000):
+        self.path = path
+        self._pending = queue.Queue(max_pending)
+        self._local = threading.local()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        with self._connect() as db:
+            db.executescript(SCHEMA)
+
+    @property
+    def pending(self):
+        return self._pending.qsize()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")  # Durable across process crashes; fsync at checkpoints
+        return db
+
+    def _reader(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = self._connect()
+        return db
+
+    def save(self, course, template_id):
+        """Queues a generated Course to be stored (replacing an earlier version of the same course)."""
+        self._start_writer()
+        try:
+            self._pending.put_nowait((course, template_id, time.time()))
+        except queue.Full:
+            logger.warning("Course store queue is full; not storing %s", course.course_code or course.course_name)
+
+    def _start_writer(self):
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_pending, name="course-store", daemon=True)
+                self._writer.start()
+
+    def _write_pending(self):
+        db = self._connect()
+        while True:
+            batch = [self._pending.get()]
+            while len(batch) < WRITE_BATCH:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with db:
+                    db.executemany(_UPSERT, [course_row(course, template_id, now)
+                                             for course, template_id, now in batch])
+            except Exception:
+                logger.exception("Could not store %d courses", len(batch))
+            finally:
+                for _ in batch:
+                    self._pending.task_done()
+
+    def flush(self):
+        """Waits until every queued course has been written."""
+        self._pending.join()
+
+    def save_many(self, courses, template_id, batch_size=1000):
+        """Stores an iterable of Courses right away, `batch_size` per transaction. Returns the count."""
+        db = self._reader()
+        count = 0
+        batch = []
+        for course in courses:
+            batch.append(course_row(course, template_id, time.time()))
+            if len(batch) >= batch_size:
+                with db:
+                    db.executemany(_UPSERT, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            with db:
+                db.executemany(_UPSERT, batch)
+            count += len(batch)
+        return count
+
+    def rebuild_index(self):
+        """Rebuilds the search index from the stored courses and merges it into one segment."""
+        db = self._reader()
+        with db:
+            db.execute("INSERT INTO course_index(course_index) VALUES ('rebuild')")
+        with db:
+            db.execute("INSERT INTO course_index(course_index) VALUES ('optimize')")
+
+    def search(self, query, limit=20, offset=0):
+        """
+        Returns `(total, results)` for a search box query (see match_expression()), best match
+        first; each result is a dict with the course's id, code, name, semester, template,
+        last update time and a snippet with the matched words between « and ».
+        """
+        expression = match_expression(query)
+        if not expression:
+            return 0, []
+        db = self._reader()
+        total = db.execute("SELECT count(*) FROM course_index WHERE course_index MATCH ?",
+                           (expression,)).fetchone()[0]
+        # Rank first and build snippets only for the page being returned; computing them
+        # alongside the ranking would build one for every match
+        ids = [row[0] for row in db.execute(
+            f"SELECT rowid FROM course_index WHERE course_index MATCH ? ORDER BY {_RANK} LIMIT ? OFFSET ?",
+            (expression, limit, offset))]
+        if not ids:
+            return total, []
+        rows = db.execute(
+            f"""SELECT c.id, c.course_code, c.course_name, c.semester, c.template, c.updated,
+                       snippet(course_index, -1, '«', '»', '…', 16) AS snippet
+                FROM course_index JOIN courses AS c ON c.id = course_index.rowid
+                WHERE course_index MATCH ? AND course_index.rowid IN ({",".join("?" * len(ids))})""",
+            (expression, *ids)).fetchall()
+        by_id = {row["id"]: dict(row) for row in rows}
+        return total, [by_id[course_id] for course_id in ids if course_id in by_id]
+
+    def get(self, course_id):
+        """Returns the stored course (its course_schema document under "document"), or None."""
+        row = self._reader().execute(
+            "SELECT id, course_code, course_name, semester, template, document, generated, created, updated "
+            "FROM courses WHERE id = ?", (course_id,)).fetchone()
+        if row is None:
+            return None
+        course = dict(row)
+        course["document"] = json.loads(course["document"])
+        return course
+
+    def count(self):
+        return self._reader().execute("SELECT count(*) FROM courses").fetchone()[0]
@@ -0,0 +1,69 @@
+import copy
+import re
+
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+
+_R = qn("w:r")
+_RUN_TEXT_TAGS = {qn("w:t"), qn("w:tab"), qn("w:br"), qn("w:cr")}
+_XML_SPACE = qn("xml:space")
+_RUN_BREAK_RE = re.compile(r"([\t\r\n])")
+
+
+def run_text_elements(text):
+    """Returns the run content python-docx creates for `run.text = text` (w:t, w:tab, w:br)."""
+    elements = []
+    for piece in _RUN_BREAK_RE.split(text):
+        if piece == "\t":
+            elements.append(OxmlElement("w:tab"))
+        elif piece == "\r" or piece == "\n":
+            elements.append(OxmlElement("w:br"))
+        elif piece:
+            t = OxmlElement("w:t")
+            t.text = piece
+            if len(piece.strip()) < len(piece):
+                t.set(_XML_SPACE, "preserve")
+            elements.append(t)
+    return elements
+
+
+def set_run_text(r, text):
+    """
+    Replaces the text of a <w:r> the way `run.text = text` does, but leaves w:rPr and any
+    other non-text children (such as the hyperlink make_hyperlink() adds) where they are.
+    """
+    old = [child for child in r if child.tag in _RUN_TEXT_TAGS]
+    if old:
+        anchor = old[0]
+        for element in run_text_elements(text):
+            anchor.addprevious(element)
+        for child in old:
+            r.remove(child)
+    else:
+        position = 1 if len(r) and r[0].tag == qn("w:rPr") else 0
+        for offset, element in enumerate(run_text_elements(text)):
+            r.insert(position + offset, element)
+
+
+class ParagraphStamp:
+    """
+    A paragraph already built and formatted through python-docx, reused as a template:
+    stamp() inserts a deep copy with its runs' text swapped, which is far cheaper than
+    repeating the insert_paragraph_before / add_run / paragraph_format calls per item.
+    """
+
+    def __init__(self, p_element):
+        self.element = p_element
+        self.runs = [i for i, child in enumerate(p_element) if child.tag == _R]
+
+    def stamp(self, anchor, *texts):
+        """
+        Inserts a copy before `anchor` (a <w:p>) and returns it.
+        `texts` replace the text of the paragraph's runs in order; None keeps a run's text.
+        """
+        p = copy.deepcopy(self.element)
+        for index, text in zip(self.runs, texts):
+            if text is not None:
+                set_run_text(p[index], text)
+        anchor.addprevious(p)
+        return p
@@ -0,0 +1,170 @@
+import io
+import struct
+import zipfile
+import zlib
+
+# ZIP record layouts (APPNOTE.TXT 4.3.7, 4.3.9, 4.3.12, 4.3.16)
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_DATA_DESCRIPTOR = struct.Struct("<IIII")
+_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+_END_OF_CENTRAL_DIR = struct.Struct("<IHHHHIIH")
+
+_USE_DATA_DESCRIPTOR = 0x08
+_CHUNK_SIZE = 64 * 1024
+
+# Deflate level for replaced parts; 6 is zlib's (and python-docx's) default
+COMPRESS_LEVEL = 6
+
+
+class _Entry:
+    """One member of the template zip, with its compressed bytes kept ready to copy."""
+
+    __slots__ = ("name", "flags", "method", "dostime", "dosdate", "crc", "compress_size",
+                 "file_size", "create_version", "internal_attr", "external_attr", "record")
+
+    def __init__(self, info, data):
+        self.name = info.filename.encode("utf-8" if info.flag_bits & 0x800 else "cp437")
+        self.flags = info.flag_bits & ~_USE_DATA_DESCRIPTOR
+        self.method = info.compress_type
+        year, month, day, hour, minute, second = info.date_time
+        self.dostime = (hour << 11) | (minute << 5) | (second // 2)
+        self.dosdate = ((year - 1980) << 9) | (month << 5) | day
+        self.crc = info.CRC
+        self.compress_size = info.compress_size
+        self.file_size = info.file_size
+        self.create_version = (info.create_system << 8) | info.create_version
+        self.internal_attr = info.internal_attr
+        self.external_attr = info.external_attr
+        # Local header + name + compressed data, exactly as it is written to the output
+        self.record = self.local_header(self.flags, self.method, self.crc,
+                                        self.compress_size, self.file_size) + data
+
+    def local_header(self, flags, method, crc, compress_size, file_size):
+        return _LOCAL_HEADER.pack(0x04034B50, 20, flags, method, self.dostime, self.dosdate,
+                                  crc, compress_size, file_size, len(self.name), 0) + self.name
+
+    def central_header(self, flags, method, crc, compress_size, file_size, offset):
+        return _CENTRAL_HEADER.pack(
+            0x02014B50, self.create_version, 20, flags, method, self.dostime, self.dosdate,
+            crc, compress_size, file_size, len(self.name), 0, 0, 0,
+            self.internal_attr, self.external_attr, offset) + self.name
+
+
+def _end_of_central_dir(central, offset):
+    directory = b"".join(central)
+    return directory + _END_OF_CENTRAL_DIR.pack(
+        0x06054B50, 0, 0, len(central), len(central), len(directory), offset, 0)
+
+
+class DocxPackage:
+    """
+    A .docx template held as pre-compressed zip members, so a generated document can be
+    written by copying every untouched part verbatim and deflating only the parts that
+    changed (normally just word/document.xml).
+    """
+
+    def __init__(self, raw):
+        self.entries = []
+        with zipfile.ZipFile(io.BytesIO(raw)) as archive:
+            for info in archive.infolist():
+                if info.flag_bits & 0x1 or max(info.file_size, info.compress_size, info.header_offset) >= 0xFFFFFFFF:
+                    raise ValueError(f"{info.filename}: encrypted and ZIP64 members are not supported")
+                # Member data starts after the local header and its own name/extra fields
+                header = _LOCAL_HEADER.unpack_from(raw, info.header_offset)
+                start = info.header_offset + _LOCAL_HEADER.size + header[9] + header[10]
+                self.entries.append(_Entry(info, raw[start:start + info.compress_size]))
+        self._layouts = {}
+
+    def _layout(self, names):
+        """
+        Splits the members into runs of untouched records (joined into one bytes object)
+        and the entries named in `names`, cached per set of replaced names.
+        Returns [(static_bytes, static_entries, replaced_entry_or_None), ...].
+        """
+        key = frozenset(names)
+        layout = self._layouts.get(key)
+        if layout is None:
+            layout, static = [], []
+            for entry in self.entries:
+                if entry.name.decode("utf-8") in key:
+                    layout.append((b"".join(e.record for e in static), static, entry))
+                    static = []
+                else:
+                    static.append(entry)
+            layout.append((b"".join(e.record for e in static), static, None))
+            self._layouts[key] = layout
+        return layout
+
+    def _static_central(self, entries, offset, central):
+        for entry in entries:
+            central.append(entry.central_header(entry.flags, entry.method, entry.crc,
+                                                entry.compress_size, entry.file_size, offset))
+            offset += len(entry.record)
+        return offset
+
+    def iter_zip(self, replacements):
+        """
+        Yields the bytes of a new .docx, chunk by chunk.
+        - `replacements`: {member name: new uncompressed bytes}, e.g. {"word/document.xml": xml}
+        Replaced members are deflated as they stream and sized with a trailing data descriptor.
+        """
+        offset = 0
+        central = []
+
+        for static_bytes, static_entries, entry in self._layout(replacements):
+            if static_bytes:
+                yield static_bytes
+            offset = self._static_central(static_entries, offset, central)
+            if entry is None:
+                continue
+
+            new_data = replacements[entry.name.decode("utf-8")]
+            flags, method = entry.flags | _USE_DATA_DESCRIPTOR, zipfile.ZIP_DEFLATED
+            header = entry.local_header(flags, method, 0, 0, 0)
+            yield header
+
+            compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -15)
+            crc = compress_size = 0
+            file_size = len(new_data)
+            for i in range(0, file_size, _CHUNK_SIZE):
+                piece = new_data[i:i + _CHUNK_SIZE]
+                crc = zlib.crc32(piece, crc)
+                out = compressor.compress(piece)
+                if out:
+                    compress_size += len(out)
+                    yield out
+            out = compressor.flush()
+            compress_size += len(out)
+            yield out + _DATA_DESCRIPTOR.pack(0x08074B50, crc, compress_size, file_size)
+
+            central.append(entry.central_header(flags, method, crc, compress_size, file_size, offset))
+            offset += len(header) + compress_size + _DATA_DESCRIPTOR.size
+
+        yield _end_of_central_dir(central, offset)
+
+    def build(self, replacements):
+        """
+        Returns a complete .docx as bytes. Replaced members are compressed in one pass and
+        carry their CRC and sizes in the local header, so no data descriptors are needed.
+        """
+        offset = 0
+        out, central = [], []
+
+        for static_bytes, static_entries, entry in self._layout(replacements):
+            out.append(static_bytes)
+            offset = self._static_central(static_entries, offset, central)
+            if entry is None:
+                continue
+
+            new_data = replacements[entry.name.decode("utf-8")]
+            compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -15)
+            data = compressor.compress(new_data) + compressor.flush()
+            crc = zlib.crc32(new_data)
+            method = zipfile.ZIP_DEFLATED
+            record = entry.local_header(entry.flags, method, crc, len(data), len(new_data)) + data
+            out.append(record)
+            central.append(entry.central_header(entry.flags, method, crc, len(data), len(new_data), offset))
+            offset += len(record)
+
+        out.append(_end_of_central_dir(central, offset))
+        return b"".join(out)
@@ -0,0 +1,29 @@
+"""
+Production server settings:  gunicorn -c gunicorn.conf.py
+
+The app is imported once in the master (preload_app), so create_app() parses the templates
+and compiles their render plans before the workers fork; they share those pages copy-on-write.
+The render pool, job threads and caches are created lazily, i.e. separately in each worker.
+Point the load balancer's readiness check at /readyz and its liveness check at /healthz.
+For fast cold starts, set TEMPLATE_SNAPSHOT_DIR and run `flask --app app syllabus prebuild`
+while building the image; new instances then load compiled templates instead of parsing them.
+"""
+import gc
+import multiprocessing
+import os
+
+wsgi_app = "app:app"
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))  # Job status polls are cheap; let them share a worker
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+preload_app = True
+max_requests = 2000  # Recycle workers now and then so a leak can't grow without bound
+max_requests_jitter = 200
+
+
+def pre_fork(server, worker):
+    # Move everything allocated so far (the parsed template, compiled plan, imported modules)
+    # out of the garbage collector's reach, so collections in the workers don't touch those
+    # pages and un-share them.
+    gc.freeze()
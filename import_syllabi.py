@@ -0,0 +1,382 @@
+"""
+Imports existing syllabus .docx files back into course records.
+
+    python import_syllabi.py legacy/ -o courses.jsonl                    # records for /generate/batch
+    python import_syllabi.py legacy/ -o courses.jsonl --api              # /api/v1/syllabus documents
+    python import_syllabi.py legacy/ -o courses.jsonl --errors bad.jsonl -j 8
+
+Two layouts are recognised: the one app.py generates from template.docx (the course table,
+headings such as COURSE OBJECTIVES, "UNIT n: title (No. of Periods: n)", numbered and
+CO-numbered items, hyperlinked video lines) and okay.docx-style documents ("Semester: ..."
+label lines, "UNIT I title" headings). Files are parsed on a process pool and written in
+file order, one JSON line per imported file; a file that can't be read or doesn't validate
+against course_schema is reported (on stderr or in --errors) without stopping the run.
+Progress and throughput go to stderr.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from lxml import etree
+
+from course_schema import CourseValidationError, validate_course
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_R_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+_RELATIONSHIP = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+
+BATCH_SIZE = 16  # Files per worker task
+MAX_DOCUMENT_BYTES = 50 * 1024 * 1024  # Uncompressed word/document.xml; anything bigger isn't a syllabus
+
+LIST_SECTIONS = {
+    "COURSE OBJECTIVES": "objectives",
+    "LIST OF EXPERIMENTS": "experiments",
+    "COURSE OUTCOMES": "course_outcomes",
+    "TEXTBOOKS": "textbooks",
+    "TEXT BOOKS": "textbooks",
+    "REFERENCES": "references",
+}
+TEXT_SECTIONS = {
+    "COURSE DESCRIPTION": "course_description",
+    "PREREQUISITES": "prerequisites",
+    "COURSE FORMAT": "course_format",
+    "ASSESSMENTS AND GRADING": "assessments_grading",
+    "ASSESSMENTS & GRADING": "assessments_grading",
+}
+LABELS = {"SEMESTER": "semester", "COURSE NAME": "course_name", "COURSE CODE": "course_code"}
+
+_LABEL_RE = re.compile(r"(Semester|Course Name|Course Code)\s*:\s*(.*)", re.IGNORECASE)
+_UNIT_RE = re.compile(r"UNIT\b\s*(?:(?:\d+|[IVXLC]+)\b)?\s*[:.\-–]?\s*(.*?)\s*(?:\(No\. of Periods:\s*(\d+)\))?")
+_TOTAL_RE = re.compile(r"TOTAL (?:NUMBER OF )?PERIODS\s*:?\s*\d*", re.IGNORECASE)
+_PRACTICAL_RE = re.compile(r"PRACTICAL PERIODS\s*:?\s*(\d*)", re.IGNORECASE)
+_ITEM_NUMBER_RE = re.compile(r"(?:\d+\.|CO\s?\d+[:.\-]?)\s+")  # "1.    " / "CO1      " written by the replacers
+
+
+class SyllabusFormatError(Exception):
+    """Raised for a file that isn't a readable syllabus."""
+
+
+def _paragraph_text(p):
+    out = []
+    for element in p.iter(f"{_W}t", f"{_W}tab", f"{_W}br", f"{_W}cr"):
+        if element.tag == f"{_W}t":
+            out.append(element.text or "")
+        else:
+            out.append("\t" if element.tag == f"{_W}tab" else "\n")
+    return "".join(out)
+
+
+def _heading(text):
+    return " ".join(text.split()).rstrip(":").upper()
+
+
+def _hyperlink(p, rels):
+    """Returns the URL of the first hyperlink in `p`, or None."""
+    for link in p.iter(f"{_W}hyperlink"):
+        rid = link.get(_R_ID)
+        if rid:
+            # The replacers store the URL itself as the r:id; Word writes a relationship id
+            return rels.get(rid, rid)
+    return None
+
+
+def _read_parts(path):
+    try:
+        with zipfile.ZipFile(path) as archive:
+            info = archive.getinfo("word/document.xml")
+            if info.file_size > MAX_DOCUMENT_BYTES:
+                raise SyllabusFormatError(f"word/document.xml is larger than {MAX_DOCUMENT_BYTES} bytes")
+            document = archive.read(info)
+            try:
+                rels_xml = archive.read("word/_rels/document.xml.rels")
+            except KeyError:
+                rels_xml = None
+    except (zipfile.BadZipFile, KeyError) as e:
+        raise SyllabusFormatError(f"not a .docx file ({e})") from None
+
+    rels = {}
+    if rels_xml:
+        for rel in etree.fromstring(rels_xml).iter(_RELATIONSHIP):
+            rels[rel.get("Id")] = rel.get("Target")
+    return etree.fromstring(document), rels
+
+
+def parse_syllabus(path):
+    """Reads one .docx and returns a course document shaped like course_schema's input."""
+    root, rels = _read_parts(path)
+    body = root.find(f"{_W}body")
+    if body is None:
+        raise SyllabusFormatError("document has no body")
+
+    course = {name: "" for name in ("semester", "course_name", "course_code", "course_description",
+                                    "prerequisites", "course_format", "assessments_grading",
+                                    "practical_periods")}
+    course.update({name: [] for name in set(LIST_SECTIONS.values())})
+    course["units"] = []
+    course["youtube_references"] = []
+
+    section = None  # ("list", name) | ("text", name) | ("unit", unit dict)
+    text_lines = {}
+    seen_heading = False
+
+    for element in body:
+        if element.tag == f"{_W}tbl":
+            _read_course_table(element, course)
+            continue
+        if element.tag != f"{_W}p":
+            continue
+        text = _paragraph_text(element).strip()
+        if not text:
+            continue
+        heading = _heading(text)
+
+        url = _hyperlink(element, rels)
+        if url is not None:
+            title, _, description = text.partition(" - ")
+            course["youtube_references"].append(
+                {"title": title.strip(), "description": description.strip() or title.strip(), "url": url})
+            section = None
+            continue
+
+        label = _LABEL_RE.fullmatch(text)
+        if label:
+            course[LABELS[label.group(1).upper()]] = label.group(2).strip()
+            continue
+        if heading in LIST_SECTIONS:
+            section, seen_heading = ("list", LIST_SECTIONS[heading]), True
+            continue
+        if heading in TEXT_SECTIONS:
+            section, seen_heading = ("text", TEXT_SECTIONS[heading]), True
+            text_lines[section[1]] = []
+            continue
+        if _TOTAL_RE.fullmatch(text):
+            section = None
+            continue
+        practical = _PRACTICAL_RE.fullmatch(text)
+        if practical:
+            course["practical_periods"] = practical.group(1)
+            section = None
+            continue
+        unit = _UNIT_RE.fullmatch(text) if text.startswith("UNIT") else None
+        if unit:
+            section, seen_heading = ("unit", {"title": unit.group(1), "content": [],
+                                              "periods": int(unit.group(2) or 0)}), True
+            course["units"].append(section[1])
+            continue
+
+        if section is None:
+            if not seen_heading and not course["semester"]:
+                course["semester"] = text  # The generated layout's first line is the bare semester
+            continue
+        kind, target = section
+        if kind == "list":
+            course[target].append(_ITEM_NUMBER_RE.sub("", text, count=1) if _ITEM_NUMBER_RE.match(text) else text)
+        elif kind == "text":
+            text_lines[target].append(text)
+        else:
+            target["content"].append(text)
+
+    for name, lines in text_lines.items():
+        course[name] = "\n".join(lines)
+    for unit in course["units"]:
+        unit["content"] = "\n".join(unit["content"])
+        if not unit["title"]:
+            unit["title"] = unit["content"].split("\n", 1)[0][:80]
+    return course
+
+
+def _read_course_table(table, course):
+    """The generated layout's header table: "Course Code" over the code, the name beside them."""
+    rows = [[_paragraph_text(tc).strip() for tc in tr.iter(f"{_W}tc")] for tr in table.iter(f"{_W}tr")]
+    rows = [["" if text == "<REMOVE>" else text for text in cells] for cells in rows]  # Left in cells for empty values
+    for r, cells in enumerate(rows):
+        for c, text in enumerate(cells):
+            if text.upper() == "COURSE CODE" and r + 1 < len(rows):
+                below = rows[r + 1]
+                if c < len(below) and not course["course_code"]:
+                    course["course_code"] = below[c]
+                if c + 1 < len(cells) and not course["course_name"]:
+                    course["course_name"] = cells[c + 1] or (below[c + 1] if c + 1 < len(below) else "")
+                return
+
+
+def form_record(course):
+    """Converts a course document into the form-field record /generate/batch reads."""
+    record = {
+        "Semester": course["semester"],
+        "CourseName": course["course_name"],
+        "CourseCode": course["course_code"],
+        "CourseDescription": course["course_description"],
+        "Prerequisites": course["prerequisites"],
+        "courseformat": course["course_format"],
+        "AssessmentsGrading": course["assessments_grading"],
+        "objective": course["objectives"],
+        "experiments": course["experiments"],
+        "course_outcome": course["course_outcomes"],
+        "textbook": course["textbooks"],
+        "reference": course["references"],
+    }
+    if course["practical_periods"]:
+        record["hasPractical"] = True
+        record["practical_periods"] = course["practical_periods"]
+    for i, unit in enumerate(course["units"], 1):
+        record[f"unit_title_{i}"] = unit["title"]
+        record[f"unit_content_{i}"] = unit["content"]
+        record[f"unit_periods_{i}"] = str(unit["periods"])
+    for i, video in enumerate(course["youtube_references"], 1):
+        record[f"youtube_title_{i}"] = video["title"]
+        record[f"youtube_desc_{i}"] = video["description"]
+        record[f"youtube_url_{i}"] = video["url"]
+    return {key: value for key, value in record.items() if value}
+
+
+def import_file(path, api=False):
+    """
+    Worker job: returns `(record, None)` for a file that imported cleanly, else `(None, error)`.
+    Never raises, so one bad file can't take the run down.
+    """
+    try:
+        course = parse_syllabus(path)
+        validate_course(course)
+        return (course if api else form_record(course)), None
+    except CourseValidationError as e:
+        return None, "does not validate: " + "; ".join(e.errors[:5])
+    except SyllabusFormatError as e:
+        return None, str(e)
+    except Exception as e:
+        return None, f"{e.__class__.__name__}: {e}"
+
+
+def import_batch(paths, api=False):
+    """Worker job: import_file() over several files, so small files aren't dominated by IPC."""
+    return [import_file(path, api) for path in paths]
+
+
+def find_documents(paths):
+    """Yields the .docx files under `paths` (files or directories) in sorted order."""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, names in os.walk(path):
+            dirs.sort()
+            for name in sorted(names):
+                if name.lower().endswith(".docx") and not name.startswith("~$"):  # Skip Word lock files
+                    yield os.path.join(root, name)
+
+
+def _batches(files, size):
+    batch = []
+    for path in files:
+        batch.append(path)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _import_alone(path, api):
+    """Imports one file on a fresh single-worker pool, so a crash can be pinned on it."""
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        try:
+            return executor.submit(import_file, path, api).result()
+        except BrokenProcessPool:
+            return None, "worker process crashed"
+
+
+def import_all(files, jobs, api=False, batch_size=BATCH_SIZE):
+    """
+    Yields `(path, record, error)` in file order, parsing batches of files on `jobs` processes.
+    A worker that dies takes the whole pool with it; the files that were in flight are then
+    imported one by one in their own process (reporting the one that crashes it), and the
+    rest of the run continues on a fresh pool.
+    """
+    if jobs <= 1:
+        for path in files:
+            yield (path, *import_file(path, api))
+        return
+
+    batches = _batches(files, batch_size)
+    while True:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        in_flight = deque()
+        try:
+            while True:
+                if len(in_flight) >= jobs * 4:  # Enough queued to keep every worker busy
+                    batch, future = in_flight[0]
+                    results = future.result()
+                    in_flight.popleft()
+                    for path, result in zip(batch, results):
+                        yield (path, *result)
+                    continue
+                batch = next(batches, None)
+                if batch is None:
+                    break
+                in_flight.append((batch, executor.submit(import_batch, batch, api)))
+            while in_flight:
+                batch, future = in_flight[0]
+                results = future.result()
+                in_flight.popleft()
+                for path, result in zip(batch, results):
+                    yield (path, *result)
+            return
+        except BrokenProcessPool:
+            executor.shutdown(wait=False, cancel_futures=True)
+            for batch, _ in in_flight:
+                for path in batch:
+                    yield (path, *_import_alone(path, api))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("paths", nargs="+", metavar="PATH", help=".docx files or directories to scan")
+    parser.add_argument("-o", "--output", help="JSONL file to write (default: stdout)")
+    parser.add_argument("--errors", metavar="FILE", help="write failures as JSONL here instead of stderr")
+    parser.add_argument("--api", action="store_true",
+                        help="write /api/v1/syllabus documents instead of /generate/batch records")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="worker processes")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    errors = open(args.errors, "w", encoding="utf-8") if args.errors else None
+    started = last_report = time.perf_counter()
+    done = failed = 0
+    try:
+        for path, record, error in import_all(find_documents(args.paths), args.jobs, args.api):
+            done += 1
+            if error is None:
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            else:
+                failed += 1
+                if errors is not None:
+                    errors.write(json.dumps({"file": path, "error": error}, ensure_ascii=False) + "\n")
+                else:
+                    print(f"{path}: {error}", file=sys.stderr)
+            now = time.perf_counter()
+            if now - last_report >= 2:
+                last_report = now
+                print(f"  {done} files, {failed} failed, {done / (now - started):.0f} files/s", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if errors is not None:
+            errors.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Imported {done - failed} of {done} files in {elapsed:.1f}s "
+          f"({done / elapsed if elapsed else 0:.0f} files/s), {failed} failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    """Raised when `max_active` jobs are already queued or running."""
+
+
+class Job:
+    """One background generation: its state, and the finished file once it is done."""
+
+    __slots__ = ("id", "kind", "status", "created", "started", "finished",
+                 "filename", "mimetype", "result", "error")
+
+    def __init__(self, kind, filename, mimetype):
+        self.id = secrets.token_urlsafe(16)
+        self.kind = kind
+        self.status = "queued"  # queued → running → done | failed
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.filename = filename
+        self.mimetype = mimetype
+        self.result = None
+        self.error = None
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "error": self.error,
+        }
+
+
+class JobStore:
+    """
+    Runs generation jobs on background threads and keeps their results in memory.
+    - `workers`: threads running jobs (heavy rendering can still go to the render pool)
+    - `max_active`: queued + running jobs allowed; beyond that submit() raises JobQueueFull
+    - `ttl`: seconds a finished job (and its file) is kept for polling and download
+    - `max_results` / `max_result_bytes`: finished jobs kept, and the total size of their
+      files; beyond either, the oldest finished jobs are forgotten before their `ttl` is up
+    A result larger than `max_result_bytes` on its own is not kept: its job fails instead.
+    Jobs live in this process only, so polls must reach the process that accepted the job.
+    """
+
+    def __init__(self, workers, max_active, ttl, max_results=200, max_result_bytes=256 * 1024 * 1024):
+        self.max_active = max_active
+        self.ttl = ttl
+        self.max_results = max_results
+        self.max_result_bytes = max_result_bytes
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._jobs = OrderedDict()  # Oldest first, for expiry
+        self._finished = OrderedDict()  # id → result size, in the order jobs finished
+        self._result_bytes = 0
+        self._active = 0
+        self._lock = threading.Lock()
+
+    @property
+    def result_bytes(self):
+        return self._result_bytes
+
+    def submit(self, kind, fn, *args, filename, mimetype):
+        """Queues `fn(*args)`, which returns the result bytes, and returns its Job."""
+        job = Job(kind, filename, mimetype)
+        with self._lock:
+            self._expire()
+            if self._active >= self.max_active:
+                raise JobQueueFull(f"{self._active} jobs already waiting")
+            self._active += 1
+            self._jobs[job.id] = job
+        try:
+            self._executor.submit(self._run, job, fn, args)
+        except BaseException:
+            with self._lock:
+                self._active -= 1
+                del self._jobs[job.id]
+            raise
+        return job
+
+    def get(self, job_id):
+        """Returns the Job, or None if it is unknown or has expired."""
+        with self._lock:
+            self._expire()
+            return self._jobs.get(job_id)
+
+    def _run(self, job, fn, args):
+        job.status = "running"
+        job.started = time.time()
+        try:
+            result = fn(*args)
+            if len(result) > self.max_result_bytes:
+                job.error = f"result is larger than {self.max_result_bytes} bytes"
+                job.status = "failed"
+            else:
+                job.result = result
+                job.status = "done"
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job.id, job.kind)
+            job.error = f"{e.__class__.__name__}: {e}"
+            job.status = "failed"
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                self._active -= 1
+                if job.id in self._jobs:
+                    size = len(job.result) if job.result is not None else 0
+                    self._finished[job.id] = size
+                    self._result_bytes += size
+                    while len(self._finished) > self.max_results or self._result_bytes > self.max_result_bytes:
+                        self._forget(next(iter(self._finished)))
+
+    def _forget(self, job_id):
+        del self._jobs[job_id]
+        self._result_bytes -= self._finished.pop(job_id)
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for job_id, job in list(self._jobs.items()):
+            if job.finished is not None and job.finished < cutoff:
+                self._forget(job_id)
+            elif job.created >= cutoff:
+                break  # Everything after this was created more recently
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
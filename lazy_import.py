@@ -0,0 +1,19 @@
+import importlib
+
+
+def lazy_callable(module, name):
+    """
+    Stands in for `from module import name` when `name` is only ever called (a function
+    or class), importing `module` on the first call rather than when this module loads.
+    Keeps python-docx off the startup path of processes that render from a compiled plan.
+    """
+    target = None
+
+    def call(*args, **kwargs):
+        nonlocal target
+        if target is None:
+            target = getattr(importlib.import_module(module), name)
+        return target(*args, **kwargs)
+
+    call.__name__ = call.__qualname__ = name
+    return call
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+SUFFIXES = (".docx", ".pdf")  # File types kept in the disk tier (and pruned by it)
+
+# mkstemp() creates files readable by their owner only; cached files are made 0644 (less
+# the umask) so every process sharing the disk tier can read them, whichever user it runs as
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o644 & ~_UMASK
+
+
+def cache_key(version, payload, renderer=""):
+    """
+    Returns a hex digest naming one rendered document.
+    - `version`: the template version (TemplateSnapshot.version)
+    - `payload`: JSON-serialisable course data, already normalised (cleaned text, parsed numbers)
+    - `renderer`: fingerprint of the rendering code, so documents cached on disk (and ETags
+      held by clients) from before a deploy aren't served for the new code
+    """
+    blob = json.dumps([version, renderer, payload], sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class OutputCache:
+    """
+    Generated documents by content key: an LRU in memory bounded by total bytes, and
+    optionally a directory on disk that survives restarts and is shared between processes.
+    - `max_bytes`: memory budget; documents larger than a quarter of it are kept on disk only
+    - `directory`: where the disk tier lives (None disables it)
+    - `max_disk_bytes`: disk budget; the least recently used files are removed first
+    Other formats of the same document (e.g. its PDF) are stored under the same key with
+    a different `suffix`.
+    """
+
+    def __init__(self, max_bytes, directory=None, max_disk_bytes=None):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_size = None  # Bytes on disk, counted on the first write
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self, key, suffix=".docx"):
+        """Returns the cached bytes for `key`, or None."""
+        key += suffix
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                return data
+
+        data = self._read_disk(key)
+        if data is not None:
+            self._remember(key, data)
+        return data
+
+    def put(self, key, data, suffix=".docx"):
+        """Stores `data` under `key` in memory and, if enabled, on disk."""
+        key += suffix
+        self._remember(key, data)
+        self._write_disk(key, data)
+
+    def _remember(self, key, data):
+        if len(data) * 4 > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # Reads count as use for pruning
+            return data
+        except OSError:
+            return None
+
+    def _write_disk(self, key, data):
+        if not self.directory:
+            return
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file and rename, so readers never see a partial document
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    os.fchmod(f.fileno(), FILE_MODE)
+                    f.write(data)
+                os.replace(tmp, path)
+            except OSError:
+                os.unlink(tmp)
+                raise
+        except OSError:
+            return
+        if self.max_disk_bytes:
+            with self._disk_lock:
+                if self._disk_size is None:
+                    self._disk_size = sum(size for _, size, _ in self._disk_files())
+                else:
+                    self._disk_size += len(data)
+                if self._disk_size > self.max_disk_bytes:
+                    self._prune_disk()
+
+    def _disk_files(self):
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(SUFFIXES):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime_ns, stat.st_size, path))
+        return files
+
+    def _prune_disk(self):
+        """Removes the least recently used files until the disk tier is back under budget."""
+        files = self._disk_files()
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        self._disk_size = total
@@ -0,0 +1,275 @@
+import logging
+import math
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+PDF_FILTER = "writer_pdf_Export"
+_CONNECT_TIMEOUT = 30  # Seconds a fresh soffice gets to start accepting connections
+
+_uno = None  # LibreOffice's Python bridge once load_uno() has run (False if it isn't installed)
+_uno_lock = threading.Lock()
+
+
+class PdfConverterUnavailable(Exception):
+    """Raised when no LibreOffice executable is installed or configured."""
+
+
+class PdfConverterBusy(Exception):
+    """Raised when `max_pending` conversions are already waiting; `retry_after` is a hint in seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"PDF converter is busy, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class PdfConversionError(Exception):
+    """Raised when LibreOffice fails to convert a document."""
+
+
+class PdfConversionTimeout(PdfConversionError):
+    """Raised when a conversion (including the wait for a free converter) takes longer than `timeout`."""
+
+
+def find_soffice(configured=None):
+    """Returns the LibreOffice executable to use, or None if there is none."""
+    if configured:
+        return shutil.which(configured)
+    return shutil.which("soffice") or shutil.which("libreoffice")
+
+
+def load_uno():
+    """
+    Imports LibreOffice's Python bridge (python3-uno on Debian/Ubuntu) on first use, so
+    processes that never export a PDF don't load it. Returns the `uno` module, or None.
+    """
+    global _uno
+    with _uno_lock:
+        if _uno is None:
+            try:
+                import uno
+            except ImportError:
+                uno = False
+            _uno = uno
+    return _uno or None
+
+
+def _properties(**values):
+    from com.sun.star.beans import PropertyValue  # Importable once load_uno() has loaded the bridge
+    return tuple(PropertyValue(Name=name, Value=value) for name, value in values.items())
+
+
+class _Converter:
+    """
+    One headless soffice with its own profile directory, started on first use and kept
+    running between conversions. With the `uno` bridge, documents are converted over a
+    pipe connection to that process; without it, each conversion is a short-lived
+    `soffice --convert-to` that at least reuses the already-initialised profile.
+    A converter that crashes or times out is killed and started again on its next use.
+    `lock` is held while the converter starts or converts, so warming can't race a conversion.
+    """
+
+    def __init__(self, soffice, name, uno=None):
+        self.soffice = soffice
+        self.uno = uno
+        self.pipe = f"syllabus-pdf-{os.getpid()}-{name}"
+        self.profile = tempfile.mkdtemp(prefix="soffice-profile-")
+        self.workdir = tempfile.mkdtemp(prefix="soffice-work-")
+        self.process = None
+        self.lock = threading.Lock()
+        self._desktop = None
+
+    def _command(self, *args):
+        return [self.soffice, f"-env:UserInstallation={Path(self.profile).as_uri()}",
+                "--headless", "--invisible", "--nologo", "--norestore", "--nodefault", "--nolockcheck", *args]
+
+    def _start(self):
+        self.process = subprocess.Popen(
+            self._command(f"--accept=pipe,name={self.pipe};urp;StarOffice.ComponentContext"),
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True)  # Own process group, so stop() also reaches soffice.bin
+        local = self.uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+        deadline = time.monotonic() + _CONNECT_TIMEOUT
+        while True:
+            try:
+                context = resolver.resolve(f"uno:pipe,name={self.pipe};urp;StarOffice.ComponentContext")
+                break
+            except Exception:  # NoConnectException until soffice is listening
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.stop()
+                    raise PdfConversionError("LibreOffice did not start")
+                time.sleep(0.1)
+        self._desktop = context.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", context)
+
+    def warm(self):
+        """Starts soffice now rather than on the first conversion."""
+        with self.lock:
+            self._ensure_started()
+
+    def _ensure_started(self):
+        if self.uno is not None and (self.process is None or self.process.poll() is not None):
+            self._start()
+
+    def convert(self, docx, timeout):
+        started = time.monotonic()
+        if not self.lock.acquire(timeout=timeout):  # Still starting up in warm()
+            raise PdfConversionTimeout(f"LibreOffice did not start within {timeout:.0f}s")
+        try:
+            return self._convert(docx, max(timeout - (time.monotonic() - started), 1))
+        finally:
+            self.lock.release()
+
+    def _convert(self, docx, timeout):
+        source = os.path.join(self.workdir, "document.docx")
+        target = os.path.join(self.workdir, "document.pdf")
+        with open(source, "wb") as f:
+            f.write(docx)
+        try:
+            if self.uno is not None:
+                self._convert_uno(source, target, timeout)
+            else:
+                self._convert_cli(source, timeout)
+            with open(target, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise PdfConversionError("LibreOffice produced no PDF") from None
+        finally:
+            for path in (source, target):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _convert_uno(self, source, target, timeout):
+        self._ensure_started()
+        # UNO calls can't be interrupted, so a hung conversion is ended by killing soffice
+        timed_out = threading.Event()
+        watchdog = threading.Timer(timeout, lambda: (timed_out.set(), self.stop()))
+        watchdog.start()
+        try:
+            document = self._desktop.loadComponentFromURL(
+                Path(source).as_uri(), "_blank", 0, _properties(Hidden=True, ReadOnly=True))
+            try:
+                document.storeToURL(Path(target).as_uri(), _properties(FilterName=PDF_FILTER))
+            finally:
+                document.close(True)
+        except Exception as e:
+            if timed_out.is_set():
+                raise PdfConversionTimeout(f"conversion took longer than {timeout:.0f}s") from None
+            self.stop()  # Don't trust the process after an error; restart it next time
+            raise PdfConversionError(f"LibreOffice failed: {e}") from None
+        finally:
+            watchdog.cancel()
+
+    def _convert_cli(self, source, timeout):
+        self.process = subprocess.Popen(
+            self._command("--convert-to", "pdf", "--outdir", self.workdir, source),
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            start_new_session=True)
+        try:
+            _, stderr = self.process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.stop()
+            raise PdfConversionTimeout(f"conversion took longer than {timeout:.0f}s") from None
+        if self.process.returncode != 0:
+            raise PdfConversionError(f"soffice exited with {self.process.returncode}: "
+                                     f"{stderr.decode(errors='replace').strip()[:500]}")
+
+    def stop(self):
+        process, self.process, self._desktop = self.process, None, None
+        if process is not None and process.poll() is None:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            process.wait()
+
+    def close(self):
+        self.stop()
+        shutil.rmtree(self.profile, ignore_errors=True)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class PdfConverterPool:
+    """
+    Converts .docx bytes to PDF on a fixed set of warm LibreOffice processes.
+    - `soffice`: path to the LibreOffice executable (see find_soffice())
+    - `workers`: soffice processes kept running; each converts one document at a time
+    - `max_pending`: conversions allowed running or waiting; beyond that convert() raises PdfConverterBusy
+    - `timeout`: seconds a conversion may take, counting the wait for a free process
+    Without LibreOffice's Python bridge (python3-uno) the processes can't be kept running:
+    every conversion then starts its own soffice, which costs seconds per document. The
+    pool logs a warning once when it starts in that mode.
+    """
+
+    def __init__(self, soffice, workers, max_pending, timeout):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        uno = load_uno()
+        if uno is None:
+            logger.warning("python3-uno is not installed, so PDF export starts a new LibreOffice "
+                           "for every conversion; install it to keep %d converters running", workers)
+        self._converters = [_Converter(soffice, i, uno) for i in range(workers)]
+        self._idle = queue.LifoQueue()  # Most recently used first, so the warmest process is reused
+        for converter in self._converters:
+            self._idle.put(converter)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._avg_seconds = 2.0  # Running average conversion time, used for Retry-After
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def warm(self):
+        """Starts every soffice process now (in the background) instead of on first use."""
+        def start(converter):
+            try:
+                converter.warm()
+            except PdfConversionError:
+                logger.exception("Could not start LibreOffice for PDF export")
+
+        for converter in self._converters:
+            threading.Thread(target=start, args=(converter,), name="pdf-warm", daemon=True).start()
+
+    def convert(self, docx, block=False):
+        """Returns `docx` converted to PDF bytes. With `block`, waits for a queue slot instead of raising."""
+        if not self._slots.acquire(blocking=block):
+            raise PdfConverterBusy(self.retry_after())
+        with self._lock:
+            self._pending += 1
+        started = time.monotonic()
+        try:
+            try:
+                converter = self._idle.get(timeout=self.timeout)
+            except queue.Empty:
+                raise PdfConversionTimeout(f"no converter free within {self.timeout}s") from None
+            try:
+                remaining = max(self.timeout - (time.monotonic() - started), 1)
+                return converter.convert(docx, remaining)
+            finally:
+                self._idle.put(converter)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * (time.monotonic() - started)
+            self._slots.release()
+
+    def retry_after(self):
+        """Seconds until the current backlog should have drained."""
+        return max(1, math.ceil(self._avg_seconds * self._pending / self.workers))
+
+    def shutdown(self):
+        for converter in self._converters:
+            converter.close()
@@ -0,0 +1,299 @@
+"""
+Golden-output harness for the renderer.
+
+    python render_diff.py record goldens/     # save today's /generate output for every payload
+    python render_diff.py record goldens/ --rev BASE   # ... as app.py at git revision BASE renders it
+    python render_diff.py check goldens/      # compare current output against the saved goldens
+    python render_diff.py compare             # compiled plan vs python-docx, in this process
+
+Goldens are only a baseline if they were recorded before the changes under test: either
+record on a checkout of the old code, or pass `--rev` with the last commit before them
+(e.g. the one the optimisation series started from). `compare` only checks the compiled
+plan against today's python-docx replacers, so a change to those shows up in `check` alone.
+
+Outputs are compared as word/document.xml, first byte for byte and then canonicalised
+(rsid attributes dropped, attribute order and namespace declarations normalised by C14N),
+so a change shows as "identical", "equivalent" or "DIFF" with the first differing lines.
+The other package parts are compared by content hash. Timings are medians in ms.
+"""
+import argparse
+import difflib
+import hashlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+
+from lxml import etree
+from werkzeug.datastructures import MultiDict
+
+import app as syllabus
+from benchmark import PAYLOADS, course_payload
+from template_cache import TemplateSnapshot
+
+DOCUMENT_PART = "word/document.xml"
+
+# Edge cases on top of the benchmark payloads: removed sections, raw PDF text, markup characters
+CORPUS = dict(PAYLOADS)
+CORPUS.update({
+    "empty": lambda: MultiDict(),
+    "heading-only": lambda: MultiDict([("Semester", "IV"), ("CourseName", "X"), ("CourseCode", "Y")]),
+    "blank-items": lambda: MultiDict([("objective", ""), ("objective", "  "), ("objective", "Only one"),
+                                      ("textbook", ""), ("reference", " ")]),
+    "practical": lambda: course_payload(units=2, experiments=8),
+    "practical-unticked": lambda: MultiDict([("practical_periods", "30"), ("unit_title_1", "A"),
+                                             ("unit_content_1", "B"), ("unit_periods_1", "x")]),
+    "markup": lambda: MultiDict([
+        ("CourseName", "Signals & <Systems>"), ("CourseDescription", 'Quotes "double" and \'single\' & more'),
+        ("objective", "a < b > c & d"), ("course_outcome", "  spaced  out  "),
+        ("youtube_title_1", "Q&A"), ("youtube_desc_1", "<intro>"),
+        ("youtube_url_1", "https://example.com/watch?v=1&t=2"),
+    ]),
+    "unit-gap": lambda: MultiDict([("unit_title_1", "A"), ("unit_content_1", "B"), ("unit_periods_1", "5"),
+                                   ("unit_title_3", "Skipped"), ("unit_content_3", "after a gap")]),
+})
+
+_RSID_ATTRS = {f"{{http://schemas.openxmlformats.org/wordprocessingml/2006/main}}{name}"
+               for name in ("rsidR", "rsidRPr", "rsidRDefault", "rsidP", "rsidDel", "rsidTr", "rsidSect")}
+
+
+def canonical(xml):
+    """Returns `xml` as canonical XML without rsid attributes (edit-session ids Word sprinkles around)."""
+    root = etree.fromstring(xml)
+    for element in root.iter():
+        for name in _RSID_ATTRS.intersection(element.attrib):
+            del element.attrib[name]
+    return etree.tostring(root, method="c14n2")
+
+
+def pretty_lines(xml):
+    root = etree.fromstring(canonical(xml))
+    etree.indent(root)
+    return etree.tostring(root, encoding="unicode").splitlines()
+
+
+def compare_xml(expected, actual, context=3, limit=40):
+    """Returns ("identical" | "equivalent" | "DIFF", diff lines)."""
+    if expected == actual:
+        return "identical", []
+    if canonical(expected) == canonical(actual):
+        return "equivalent", []
+    diff = difflib.unified_diff(pretty_lines(expected), pretty_lines(actual), "expected", "actual",
+                                n=context, lineterm="")
+    return "DIFF", list(diff)[:limit]
+
+
+_PART_PARSER = etree.XMLParser(remove_blank_text=True)
+
+
+def part_hashes(docx):
+    """
+    Content hash of every part but the main document. python-docx re-serialises every part
+    it saves (dropping indentation, reordering relationships and content types, leaving out
+    empty .rels parts and content types for extensions no part uses) while the compiled
+    path copies them from the template, so XML parts are hashed in a form where those
+    differences don't count.
+    """
+    hashes = {}
+    with zipfile.ZipFile(io.BytesIO(docx)) as archive:
+        extensions = {name.rpartition(".")[2].lower() for name in archive.namelist()}
+        for name in sorted(archive.namelist()):
+            if name == DOCUMENT_PART:
+                continue
+            data = archive.read(name)
+            if name.endswith((".xml", ".rels")):
+                root = etree.fromstring(data, _PART_PARSER)
+                if name.endswith(".rels") or name == "[Content_Types].xml":
+                    if len(root) == 0:
+                        continue
+                    root[:] = sorted((element for element in root
+                                      if element.get("Extension", "").lower() in extensions | {""}),
+                                     key=lambda element: sorted(element.attrib.items()))
+                data = canonical(etree.tostring(root))
+            hashes[name] = hashlib.sha256(data).hexdigest()
+    return hashes
+
+
+def warm_up(client):
+    """One throwaway request, so template parsing and plan compilation stay out of the timings."""
+    generate(client, PAYLOADS["typical"](), 1)
+
+
+def generate(client, form, iterations):
+    """POSTs `form` to /generate; returns (docx bytes, median ms)."""
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        with client.post("/generate", data=form) as response:
+            data = response.get_data()
+        times.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"/generate returned {response.status_code}: {data[:200]!r}")
+    return data, statistics.median(times)
+
+
+def timed_median(fn, iterations):
+    times, result = [], None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(times)
+
+
+def record(directory, iterations, rev=None):
+    os.makedirs(directory, exist_ok=True)
+    outputs = generate_at(rev, iterations) if rev else generate_here(iterations)
+    index = {}
+    for name, (docx, ms) in outputs:
+        with zipfile.ZipFile(io.BytesIO(docx)) as archive:
+            xml = archive.read(DOCUMENT_PART)
+        with open(os.path.join(directory, f"{name}.xml"), "wb") as f:
+            f.write(xml)
+        index[name] = {"ms": ms, "parts": part_hashes(docx)}
+        print(f"  {name:<20} {ms:9.2f} ms  {len(xml):>8} bytes")
+    with open(os.path.join(directory, "index.json"), "w") as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    return 0
+
+
+def generate_here(iterations):
+    """Yields (payload name, (docx bytes, median ms)) from this checkout's app."""
+    client = syllabus.app.test_client()
+    warm_up(client)
+    for name, payload in CORPUS.items():
+        yield name, generate(client, payload(), iterations)
+
+
+# Runs inside a copy of an older revision, where only its own app.py (and its template) exist
+_GENERATE_AT_SCRIPT = """
+import json, os, statistics, sys, time
+from werkzeug.datastructures import MultiDict
+import app
+client = app.app.test_client()
+payloads, iterations, out = json.load(sys.stdin)
+client.post("/generate", data=MultiDict(payloads[0][1])).close()
+for name, pairs in payloads:
+    form, times = MultiDict(pairs), []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        with client.post("/generate", data=form) as response:
+            data = response.get_data()
+        times.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            sys.exit(f"{name}: /generate returned {response.status_code}: {data[:200]!r}")
+    with open(os.path.join(out, name + ".docx"), "wb") as f:
+        f.write(data)
+    print(json.dumps([name, statistics.median(times)]), flush=True)
+"""
+
+
+def generate_at(rev, iterations):
+    """
+    Like generate_here(), but with the app as of git revision `rev`: the revision is
+    extracted to a temporary directory and its app.py serves the corpus in a subprocess.
+    """
+    archive = subprocess.run(["git", "archive", "--format=tar", rev], cwd=syllabus.BASE_DIR,
+                             capture_output=True, check=True).stdout
+    with tempfile.TemporaryDirectory(prefix="render-diff-") as checkout:
+        with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+            tar.extractall(checkout, filter="data")
+        out = os.path.join(checkout, "render-diff-output")
+        os.mkdir(out)
+        # Forms go over as (field, value) pairs, so repeated fields keep their order
+        payloads = [(name, list(payload().items(multi=True)))
+                    for name, payload in CORPUS.items()]
+        request = json.dumps([payloads, iterations, out])
+        result = subprocess.run([sys.executable, "-c", _GENERATE_AT_SCRIPT], cwd=checkout, input=request,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"rendering at {rev} failed:\n{result.stderr[-2000:]}")
+        for line in result.stdout.splitlines():
+            if line.startswith("["):
+                name, ms = json.loads(line)
+                with open(os.path.join(out, name + ".docx"), "rb") as f:
+                    yield name, (f.read(), ms)
+
+
+def check(directory, iterations):
+    with open(os.path.join(directory, "index.json")) as f:
+        index = json.load(f)
+    client = syllabus.app.test_client()
+    warm_up(client)
+    failures = 0
+    print(f"  {'payload':<20} {'result':<11} {'golden ms':>10} {'now ms':>9} {'speedup':>8}")
+    for name, golden in index.items():
+        if name not in CORPUS:
+            print(f"  {name:<20} skipped (payload no longer in the corpus)")
+            continue
+        docx, ms = generate(client, CORPUS[name](), iterations)
+        with zipfile.ZipFile(io.BytesIO(docx)) as archive:
+            xml = archive.read(DOCUMENT_PART)
+        with open(os.path.join(directory, f"{name}.xml"), "rb") as f:
+            result, diff = compare_xml(f.read(), xml)
+        parts = part_hashes(docx)
+        if result != "DIFF" and parts != golden["parts"]:
+            changed = sorted(set(parts.items()) ^ set(golden["parts"].items()))
+            result, diff = "DIFF", [f"  part changed: {part}" for part in sorted({p for p, _ in changed})]
+        failures += result == "DIFF"
+        print(f"  {name:<20} {result:<11} {golden['ms']:10.2f} {ms:9.2f} {golden['ms'] / ms:7.1f}x")
+        for line in diff:
+            print("      " + line)
+    return 1 if failures else 0
+
+
+def compare(iterations):
+    """Compiled plan (fast path) vs the python-docx replacers, on the same Course objects."""
+    template = syllabus.templates.snapshot()
+    if syllabus.get_render_plan(template) is None:
+        print("template could not be compiled into a render plan; nothing to compare")
+        return 1
+    reference = TemplateSnapshot(template.path, template.stamp, template.raw)
+    reference.plan = False
+
+    failures = 0
+    print(f"  {'payload':<20} {'result':<11} {'docx ms':>9} {'plan ms':>9} {'speedup':>8}")
+    for name, payload in CORPUS.items():
+        course = syllabus.read_course_form(payload())
+        expected, slow = timed_median(lambda: syllabus.render_course_data(reference, course), iterations)
+        actual, fast = timed_median(lambda: syllabus.render_course_data(template, course), iterations)
+        result, diff = compare_xml(expected, actual)
+        failures += result == "DIFF"
+        print(f"  {name:<20} {result:<11} {slow:9.2f} {fast:9.2f} {slow / fast:7.1f}x")
+        for line in diff:
+            print("      " + line)
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-n", "--iterations", type=int, default=5, help="renders per payload for timings")
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", parents=[common], help="save /generate output as goldens")
+    record_parser.add_argument("directory")
+    record_parser.add_argument("--rev", help="git revision whose app.py renders the goldens "
+                                             "(default: this checkout)")
+    commands.add_parser("check", parents=[common],
+                        help="compare /generate output with saved goldens").add_argument("directory")
+    commands.add_parser("compare", parents=[common], help="compiled plan vs python-docx rendering")
+    args = parser.parse_args(argv)
+
+    syllabus.output_cache = None  # Always render; a cache hit would hide the renderer under test
+    syllabus.rate_limiter = None  # Every request comes from the same client
+    syllabus.COURSE_STORE_PATH = ""  # Don't fill a configured course store with corpus courses
+    if args.command == "record":
+        return record(args.directory, args.iterations, args.rev)
+    if args.command == "check":
+        return check(args.directory, args.iterations)
+    return compare(args.iterations)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+import math
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+
+class RenderPoolBusy(Exception):
+    """Raised when the pool already has `max_pending` jobs; `retry_after` is a hint in seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"render pool is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class RenderPool:
+    """
+    A fixed set of worker processes for CPU-bound rendering.
+    - `workers`: number of processes; each runs `initializer` once (e.g. to warm the template cache)
+    - `max_pending`: jobs allowed queued or running at once; beyond that submit() raises RenderPoolBusy
+    - `timeout`: seconds run() waits for a job before raising TimeoutError
+    - `start_method`: how workers are started; the default "forkserver" starts them from a
+      clean single-threaded process, since forking a threaded server can copy a lock some
+      other thread holds into the worker, which then deadlocks on it
+    Jobs and the initializer must be importable module-level functions (they are pickled).
+    A job that times out keeps its slot until the worker finishes it, so a stuck
+    backlog turns into RenderPoolBusy rather than an ever-growing queue.
+    """
+
+    def __init__(self, workers, max_pending, timeout, initializer=None, start_method="forkserver"):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = ProcessPoolExecutor(max_workers=workers, initializer=initializer,
+                                             mp_context=multiprocessing.get_context(start_method))
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._avg_seconds = 0.1  # Running average job time, used for Retry-After
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def submit(self, fn, *args, block=False):
+        """Queues `fn(*args)` on a worker and returns its Future."""
+        if not self._slots.acquire(blocking=block):
+            raise RenderPoolBusy(self.retry_after())
+        with self._lock:
+            self._pending += 1
+        started = time.monotonic()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._release(started)
+            raise
+        future.add_done_callback(lambda _: self._release(started))
+        return future
+
+    def run(self, fn, *args):
+        """Runs `fn(*args)` on a worker and waits for the result (at most `timeout` seconds)."""
+        return self.submit(fn, *args).result(timeout=self.timeout)
+
+    def map(self, fn, iterable):
+        """
+        Yields `(args, future)` for `fn(*args)` over `iterable`, in order, keeping at most
+        `workers` jobs in flight. Waits for free slots instead of raising RenderPoolBusy.
+        """
+        in_flight = deque()
+        for args in iterable:
+            if len(in_flight) >= self.workers:
+                yield in_flight.popleft()
+            in_flight.append((args, self.submit(fn, *args, block=True)))
+        while in_flight:
+            yield in_flight.popleft()
+
+    def retry_after(self):
+        """Seconds until the current backlog should have drained."""
+        return max(1, math.ceil(self._avg_seconds * self._pending / self.workers))
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _release(self, started):
+        with self._lock:
+            self._pending -= 1
+            self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * (time.monotonic() - started)
+        self._slots.release()
+
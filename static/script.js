@@ -338,7 +338,141 @@ if (addYouTubeBtn) {
         if (this.checkValidity() === false) {
             event.preventDefault();
             alert("Please fill in the required fields.");
+            return;
+        }
+
+        // Job mode: queue the document on the server and poll for it instead of holding the request open
+        if (this.dataset.async === "true" && window.fetch && window.FormData) {
+            event.preventDefault();
+            submitAsJob(this);
         }
     });
+
+    /***** Live Preview (POST /preview after the form stops changing) *****/
+    var previewTimer = null;
+    var previewRequest = null;
+
+    function schedulePreview(delay) {
+        clearTimeout(previewTimer);
+        previewTimer = setTimeout(refreshPreview, delay);
+    }
+
+    function refreshPreview() {
+        var form = document.getElementById("courseForm");
+        var status = document.getElementById("previewStatus");
+        if (previewRequest) {
+            previewRequest.abort(); // Only the latest form contents matter
+        }
+        previewRequest = new AbortController();
+
+        fetch("/preview", { method: "POST", body: new FormData(form), signal: previewRequest.signal })
+            .then(function (response) {
+                if (response.status === 429 || response.status === 503) {
+                    // Keep the last preview and try again when the server says to
+                    var retryAfter = parseFloat(response.headers.get("Retry-After")) || 1;
+                    schedulePreview(retryAfter * 1000);
+                    return;
+                }
+                return response.text().then(function (html) {
+                    if (response.ok) {
+                        document.getElementById("preview").innerHTML = html; // Escaped by the server
+                        status.innerText = "";
+                    } else {
+                        status.innerText = html;
+                    }
+                });
+            })
+            .catch(function (error) {
+                if (error.name !== "AbortError") {
+                    status.innerText = "Preview unavailable";
+                }
+            });
+    }
+
+    if (window.fetch && window.FormData && window.AbortController) {
+        var courseForm = document.getElementById("courseForm");
+        courseForm.addEventListener("input", function () { schedulePreview(300); });
+        courseForm.addEventListener("change", function () { schedulePreview(300); });
+        // Adding or removing fields and sections changes what is sent without an input event
+        document.addEventListener("click", function (event) {
+            if (event.target.tagName === "BUTTON" && event.target.type === "button") {
+                schedulePreview(300);
+            }
+        });
+        schedulePreview(0);
+    }
+
+    /***** Background Generation Jobs (POST /jobs, poll /jobs/<id>) *****/
+    function setJobStatus(text) {
+        var status = document.getElementById("jobStatus");
+        if (status) {
+            status.innerText = text;
+        }
+    }
+
+    function submitAsJob(form) {
+        var button = form.querySelector("button[type=submit]");
+        button.disabled = true;
+        setJobStatus("Queued…");
+
+        fetch("/jobs", { method: "POST", body: new FormData(form) })
+            .then(function (response) {
+                if (response.status !== 202) {
+                    throw new Error("job mode unavailable (" + response.status + ")");
+                }
+                return response.json();
+            })
+            .then(function (job) {
+                pollJob(job.status_url, form);
+            })
+            .catch(function () {
+                // Fall back to the plain synchronous download
+                button.disabled = false;
+                setJobStatus("");
+                form.submit();
+            });
+    }
+
+    function pollJob(statusUrl, form) {
+        var button = form.querySelector("button[type=submit]");
+        fetch(statusUrl)
+            .then(function (response) {
+                if (response.status === 404) {
+                    // Jobs live in one server process's memory; this poll reached another one
+                    // (or the process was restarted), so get the document the synchronous way
+                    return { fallback: true };
+                }
+                if (!response.ok) {
+                    throw new Error("Job not found, please generate again.");
+                }
+                var retryAfter = parseFloat(response.headers.get("Retry-After")) || 1;
+                return response.json().then(function (job) {
+                    return { job: job, retryAfter: retryAfter };
+                });
+            })
+            .then(function (result) {
+                if (result.fallback) {
+                    button.disabled = false;
+                    setJobStatus("");
+                    form.submit();
+                    return;
+                }
+                var job = result.job;
+                if (job.status === "done") {
+                    button.disabled = false;
+                    setJobStatus("Done, downloading…");
+                    window.location.href = job.result_url; // Served as an attachment, so the page stays
+                } else if (job.status === "failed") {
+                    throw new Error("Generation failed: " + job.error);
+                } else {
+                    setJobStatus(job.status === "running" ? "Generating document…" : "Queued…");
+                    setTimeout(function () { pollJob(statusUrl, form); }, result.retryAfter * 1000);
+                }
+            })
+            .catch(function (error) {
+                button.disabled = false;
+                setJobStatus(error.message);
+            });
+    }
 });
 
@@ -0,0 +1,373 @@
+import copy
+import hashlib
+import io
+import logging
+import os
+import pickle
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import cached_property
+
+from docx_package import DocxPackage
+from lazy_import import lazy_callable
+
+# Only needed to parse templates, which a snapshot loaded from a prebuilt file never does
+Document = lazy_callable("docx", "Document")
+serialize_part_xml = lazy_callable("docx.opc.oxml", "serialize_part_xml")
+qn = lazy_callable("docx.oxml.ns", "qn")
+Paragraph = lazy_callable("docx.text.paragraph", "Paragraph")
+
+PLACEHOLDER_RE = re.compile(r"\{[A-Za-z]+\}")
+
+PREBUILT_FORMAT = 1  # Bump when the layout of prebuilt snapshot files changes
+
+logger = logging.getLogger(__name__)
+
+# mkstemp() creates files readable by their owner only; prebuilt files are made 0644 (less
+# the umask) so a service running as another user than the one that built them can read them
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o644 & ~_UMASK
+
+
+def paragraph_text(p_element):
+    """Joins the text of every run in a <w:p> element (same as Paragraph.text for placeholders)."""
+    return "".join(t.text or "" for t in p_element.iter(qn("w:t")))
+
+
+class PlaceholderIndex:
+    """
+    Maps every `{Placeholder}` token in a document to the paragraphs that contain it.
+    Paragraphs are stored as child-index paths from <w:body>, so one index built from
+    the pristine template can be resolved against any deep copy of it.
+    - `body`: placeholders in top-level paragraphs (what `doc.paragraphs` walks)
+    - `tables`: placeholders in table cell paragraphs (what `doc.tables` → cells walks)
+    """
+
+    def __init__(self, body_element):
+        self.body = {}
+        self.tables = {}
+
+        for i, child in enumerate(body_element):
+            if child.tag == qn("w:p"):
+                self._add(self.body, child, (i,))
+            elif child.tag == qn("w:tbl"):
+                for r, tr in enumerate(child):
+                    if tr.tag != qn("w:tr"):
+                        continue
+                    for c, tc in enumerate(tr):
+                        if tc.tag != qn("w:tc"):
+                            continue
+                        for n, p in enumerate(tc):
+                            if p.tag == qn("w:p"):
+                                self._add(self.tables, p, (i, r, c, n))
+
+    @staticmethod
+    def _add(index, p_element, path):
+        for token in set(PLACEHOLDER_RE.findall(paragraph_text(p_element))):
+            index.setdefault(token, []).append(path)
+
+    def resolve(self, doc):
+        """Binds the index to `doc`, which must be an unmodified copy of the indexed body."""
+        body = doc.element.body
+
+        def walk(path):
+            element = body
+            for i in path:
+                element = element[i]
+            return element
+
+        return LocatedPlaceholders(
+            doc,
+            {token: [walk(path) for path in paths] for token, paths in self.body.items()},
+            {token: [walk(path) for path in paths] for token, paths in self.tables.items()},
+        )
+
+
+class LocatedPlaceholders:
+    """Placeholder → paragraph lookup for one document, built by PlaceholderIndex.resolve()."""
+
+    def __init__(self, doc, body, tables):
+        self._parent = doc._body
+        self._body = body
+        self._tables = tables
+
+    def paragraphs(self, placeholder, tables=False):
+        """Returns the paragraphs (in document order) that contained `placeholder` in the template."""
+        elements = (self._tables if tables else self._body).get(placeholder, ())
+        return [Paragraph(p, self._parent) for p in elements]
+
+
+def find_paragraphs(doc, placeholder, tables=False):
+    """
+    Returns the paragraphs of `doc` holding `placeholder`, using the template's index
+    when `doc` came from a TemplateSnapshot and a one-off scan otherwise.
+    Callers should still check the paragraph text, since an earlier replacement may
+    already have consumed the placeholder.
+    """
+    located = getattr(doc, "placeholders", None)
+    if located is None:
+        located = PlaceholderIndex(doc.element.body).resolve(doc)
+        doc.placeholders = located
+    return located.paragraphs(placeholder, tables)
+
+
+class TemplateSnapshot:
+    """
+    One parsed version of a .docx template.
+    - `raw`: the untouched zip bytes of the template file
+    - `package`: the template's parts as pre-compressed zip members
+    - `element`: the pristine parsed word/document.xml tree (never modified)
+    - `stamp`: (mtime_ns, size) of the file this snapshot was read from
+    - `version`: sha256 of `raw`, so output cached against it goes stale when the template changes
+    - `id`: the file name without ".docx", as used by TemplateRegistry
+    - `nbytes`: a rough figure for the memory the snapshot holds, including its compiled plan
+      and the plan's section cache (which grows as courses are rendered), for TemplateRegistry's cap
+    The python-docx parse (`part`, `element`, `placeholders`) happens on first use, so a
+    snapshot whose plan came from a prebuilt file renders without ever parsing the template.
+    """
+
+    def __init__(self, path, stamp, raw):
+        self.path = path
+        self.id = os.path.splitext(os.path.basename(path))[0]
+        self.stamp = stamp
+        self.raw = raw
+        self.version = hashlib.sha256(raw).hexdigest()
+        self.package = DocxPackage(raw)
+        # Raw and pre-compressed copies, plus the parsed parts (lxml trees run several times their XML)
+        self.parsed_nbytes = 2 * len(raw) + 4 * sum(entry.file_size for entry in self.package.entries)
+        self.plan = None  # Compiled lazily by app.get_render_plan()
+        self.prebuilt = None  # (file, fingerprint) used by load_prebuilt() / save_prebuilt()
+        self.from_prebuilt = False
+
+    @property
+    def nbytes(self):
+        plan = self.plan
+        return self.parsed_nbytes + (plan.nbytes if plan else 0)
+
+    @cached_property
+    def part(self):
+        part = Document(io.BytesIO(self.raw)).part
+        part.rels  # Load relationships once so every copy shares them
+        return part
+
+    @cached_property
+    def element(self):
+        return self.part.element
+
+    @cached_property
+    def partname(self):
+        return self.part.partname.membername  # e.g. "word/document.xml"
+
+    @cached_property
+    def placeholders(self):
+        return PlaceholderIndex(self.element.body)
+
+    def load_prebuilt(self):
+        """
+        Takes `partname` and `plan` from the prebuilt file, if it was saved for this exact
+        template and code fingerprint. Returns True on success.
+        """
+        if self.prebuilt is None:
+            return False
+        path, fingerprint = self.prebuilt
+        try:
+            with open(path, "rb") as f:
+                saved = pickle.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception:  # Unreadable, truncated or from an incompatible version
+            logger.warning("Could not load prebuilt plan %s, parsing the template instead", path, exc_info=True)
+            return False
+        if (not isinstance(saved, dict) or saved.get("format") != PREBUILT_FORMAT
+                or saved.get("fingerprint") != fingerprint or saved.get("version") != self.version):
+            return False
+        self.partname = saved["partname"]
+        self.plan = saved["plan"]
+        self.from_prebuilt = True
+        return True
+
+    def save_prebuilt(self):
+        """Writes the compiled plan to the prebuilt file, when one is configured. Returns True on success."""
+        if self.prebuilt is None or self.plan is None or self.from_prebuilt:
+            return False
+        path, fingerprint = self.prebuilt
+        data = pickle.dumps({"format": PREBUILT_FORMAT, "fingerprint": fingerprint, "version": self.version,
+                             "partname": self.partname, "plan": self.plan}, pickle.HIGHEST_PROTOCOL)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file and rename, so other processes never load a partial file
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    os.fchmod(f.fileno(), FILE_MODE)
+                    f.write(data)
+                os.replace(tmp, path)
+            except OSError:
+                os.unlink(tmp)
+                raise
+        except OSError:
+            return False
+        return True
+
+    def new_document(self):
+        """Returns a fresh Document backed by a deep copy of the pristine body."""
+        part = copy.copy(self.part)  # Shares styles, numbering, rels (read-only)
+        part._element = copy.deepcopy(self.element)
+        doc = part.document
+        doc.placeholders = self.placeholders.resolve(doc)
+        return doc
+
+    def save(self, doc, stream):
+        """Writes `doc` to `stream`, copying every other part straight from the template."""
+        self.write(stream, serialize_part_xml(doc.element))
+
+    def write(self, stream, document_xml):
+        """Writes a .docx to `stream` with `document_xml` as its main document part."""
+        stream.write(self.build_docx(document_xml))
+
+    def build_docx(self, document_xml):
+        """Returns a .docx as bytes; only `document_xml` is compressed, every other part is copied."""
+        return self.package.build({self.partname: document_xml})
+
+    def iter_docx(self, document_xml):
+        """
+        Yields a .docx with `document_xml` as its main document part, chunk by chunk.
+        Every other part is copied from the template's compressed bytes without re-deflating.
+        """
+        return self.package.iter_zip({self.partname: document_xml})
+
+
+class TemplateCache:
+    """
+    Parses a template once and re-parses it only when the file on disk changes,
+    so edits to template.docx go live without restarting the server.
+    With `prebuilt_dir`, a new snapshot first tries `<prebuilt_dir>/<id>.plan`, which holds
+    the template's compiled plan as long as the template and `fingerprint` are unchanged.
+    """
+
+    def __init__(self, path, prebuilt_dir=None, fingerprint=""):
+        self.path = path
+        self.prebuilt_dir = prebuilt_dir
+        self.fingerprint = fingerprint
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        """Returns the last loaded TemplateSnapshot without checking the file, or None."""
+        return self._snapshot
+
+    def evict(self):
+        """Drops the loaded snapshot; the next snapshot() parses the file again."""
+        self._snapshot = None
+
+    def snapshot(self):
+        """Returns the current TemplateSnapshot. Raises FileNotFoundError if the file is missing."""
+        stat = os.stat(self.path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.stamp == stamp:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.stamp != stamp:
+                with open(self.path, "rb") as f:
+                    snapshot = TemplateSnapshot(self.path, stamp, f.read())
+                if self.prebuilt_dir:
+                    snapshot.prebuilt = (os.path.join(self.prebuilt_dir, snapshot.id + ".plan"), self.fingerprint)
+                    snapshot.load_prebuilt()
+                self._snapshot = snapshot
+        return snapshot
+
+
+TEMPLATE_ID_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]{0,63}")
+
+
+class UnknownTemplate(LookupError):
+    """Raised for a template id with no matching .docx in the registry's directory."""
+
+
+class TemplateRegistry:
+    """
+    Every `<id>.docx` in a directory, each behind its own TemplateCache, so editing one
+    template re-parses only that one and never blocks requests for the others.
+    Parsed snapshots are kept least-recently-used first under `max_bytes` (by
+    TemplateSnapshot.nbytes); the default template is never evicted.
+    `prebuilt_dir` and `fingerprint` are passed on to each TemplateCache.
+    """
+
+    def __init__(self, directory, default="template", max_bytes=256 * 1024 * 1024,
+                 prebuilt_dir=None, fingerprint=""):
+        self.directory = directory
+        self.default = default
+        self.max_bytes = max_bytes
+        self.prebuilt_dir = prebuilt_dir
+        self.fingerprint = fingerprint
+        self._caches = OrderedDict()  # id → TemplateCache, least recently used first
+        self._lock = threading.Lock()
+
+    def ids(self):
+        """Returns the ids of the templates currently in the directory, sorted."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        # "~$name.docx" are Word's lock files, not templates
+        return sorted(name[:-5] for name in names
+                      if name.endswith(".docx") and TEMPLATE_ID_RE.fullmatch(name[:-5]))
+
+    def cache(self, template_id=None):
+        """Returns the TemplateCache for `template_id` (default: the default template)."""
+        template_id = template_id or self.default
+        if not TEMPLATE_ID_RE.fullmatch(template_id):
+            raise UnknownTemplate(f"template {template_id!r} not found")
+        with self._lock:
+            cache = self._caches.get(template_id)
+            if cache is None:
+                cache = TemplateCache(os.path.join(self.directory, template_id + ".docx"),
+                                      self.prebuilt_dir, self.fingerprint)
+                self._caches[template_id] = cache
+            self._caches.move_to_end(template_id)
+        return cache
+
+    def current(self, template_id=None):
+        """Returns the loaded snapshot of `template_id` without checking the file, or None."""
+        cache = self._caches.get(template_id or self.default)
+        return cache.current() if cache is not None else None
+
+    def snapshot(self, template_id=None):
+        """
+        Returns the current TemplateSnapshot of `template_id` (default: the default template).
+        Raises UnknownTemplate if there is no such template file.
+        """
+        cache = self.cache(template_id)
+        try:
+            snapshot = cache.snapshot()
+        except FileNotFoundError:
+            with self._lock:
+                if self._caches.get(template_id or self.default) is cache:
+                    del self._caches[template_id or self.default]
+            raise UnknownTemplate(f"template {template_id or self.default!r} not found") from None
+        self._trim()
+        return snapshot
+
+    def loaded_bytes(self):
+        """Sum of TemplateSnapshot.nbytes over the snapshots held in memory."""
+        return sum(snapshot.nbytes for snapshot in map(TemplateCache.current, list(self._caches.values()))
+                   if snapshot is not None)
+
+    def _trim(self):
+        with self._lock:
+            loaded = [(template_id, cache, cache.current()) for template_id, cache in self._caches.items()]
+            total = sum(snapshot.nbytes for _, _, snapshot in loaded if snapshot is not None)
+            # Oldest first; the most recently used template stays even if it alone is over the cap
+            for template_id, cache, snapshot in loaded[:-1]:
+                if total <= self.max_bytes:
+                    break
+                if snapshot is not None and template_id != self.default:
+                    cache.evict()
+                    total -= snapshot.nbytes
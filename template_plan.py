@@ -0,0 +1,385 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from lazy_import import lazy_callable
+from metrics import record_stage
+from template_cache import find_paragraphs
+
+qn = lazy_callable("docx.oxml.ns", "qn")  # Only compiling needs python-docx (and lxml)
+
+XML_DECLARATION = "<?xml version='1.0' encoding='UTF-8' standalone='yes'?>\n"
+_XML_DECLARATION_BYTES = XML_DECLARATION.encode("utf-8")
+
+_FIELD_RE = re.compile("\ue000(\\w+)\ue001")  # Private-use chars never appear in templates
+_TEXT_FIELD_RE = re.compile('<w:t(?: xml:space="preserve")?>([^<]*\ue000\\w+\ue001[^<]*)</w:t>')
+_SLOT_RE = re.compile("<!--\ue002slot(\\d+)-->")
+_NSDECL_RE = re.compile(r' xmlns:\w+="[^"]*"')
+_RUN_BREAK_RE = re.compile(r"([\t\r\n])")
+_INVALID_XML_RE = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+
+class TemplatePlanError(Exception):
+    """Raised when a template cannot be compiled into a render plan."""
+
+
+def field(name):
+    """Returns the marker string that stands for field `name` while capturing a slot."""
+    return f"\ue000{name}\ue001"
+
+
+def _escape_text(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _escape_attr(text):
+    return (_escape_text(_INVALID_XML_RE.sub("", text)).replace('"', "&quot;")
+            .replace("\t", "&#9;").replace("\n", "&#10;").replace("\r", "&#13;"))
+
+
+def _unescape_text(xml):
+    return xml.replace("&lt;", "<").replace("&gt;", ">").replace("&amp;", "&")
+
+
+def run_text_xml(text):
+    """
+    Returns the run content python-docx writes for `run.text = text`:
+    tabs become <w:tab/>, newlines <w:br/>, and text with outer spaces is preserved.
+    """
+    out = []
+    for piece in _RUN_BREAK_RE.split(_INVALID_XML_RE.sub("", text)):
+        if piece == "\t":
+            out.append("<w:tab/>")
+        elif piece == "\r" or piece == "\n":
+            out.append("<w:br/>")
+        elif piece:
+            if len(piece.strip()) < len(piece):
+                out.append(f'<w:t xml:space="preserve">{_escape_text(piece)}</w:t>')
+            else:
+                out.append(f"<w:t>{_escape_text(piece)}</w:t>")
+    return "".join(out)
+
+
+def _serialize(element):
+    """Serialises a body element without the namespace declarations lxml adds to its root."""
+    from lxml import etree
+
+    xml = etree.tostring(element, encoding="unicode", with_tail=False)
+    end = xml.index(">")
+    return _NSDECL_RE.sub("", xml[:end]) + xml[end:]
+
+
+class _TextField:
+    """A <w:t> whose text mixes literal pieces and field values, re-emitted as run content."""
+
+    __slots__ = ("pieces",)
+
+    def __init__(self, pieces):
+        self.pieces = pieces  # [literal, name, literal, name, ..., literal]
+
+    def render(self, values):
+        pieces = self.pieces
+        text = pieces[0]
+        for i in range(1, len(pieces), 2):
+            text += values[pieces[i]] + pieces[i + 1]
+        return run_text_xml(text)
+
+
+class _AttrField:
+    """A field used as an attribute value (e.g. a hyperlink r:id)."""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def render(self, values):
+        return _escape_attr(values[self.name])
+
+
+class Fragment:
+    """
+    Serialised XML of one or more captured paragraphs, split into static strings and
+    fields so that rendering is plain string concatenation.
+    """
+
+    def __init__(self, elements):
+        xml = "".join(_serialize(element) for element in elements)
+        self.parts = []
+        pos = 0
+        for match in _TEXT_FIELD_RE.finditer(xml):
+            self._add_static(xml[pos:match.start()])
+            self.parts.append(_TextField(_FIELD_RE.split(_unescape_text(match.group(1)))))
+            pos = match.end()
+        self._add_static(xml[pos:])
+        self.fields = set(_FIELD_RE.findall(xml))
+
+    def _add_static(self, xml):
+        for i, piece in enumerate(_FIELD_RE.split(xml)):
+            if i % 2:
+                self.parts.append(_AttrField(piece))
+            elif piece:
+                self.parts.append(piece)
+
+    def render(self, values):
+        return "".join(part if part.__class__ is str else part.render(values) for part in self.parts)
+
+
+def capture(template, placeholder, replace, tables=False):
+    """
+    Runs `replace(doc)` (one of the replace_* functions) on a scratch copy of the template
+    and returns the elements it left where the `placeholder` paragraph was.
+    """
+    doc = template.new_document()
+    paragraphs = find_paragraphs(doc, placeholder, tables=tables)
+    if not paragraphs:
+        raise TemplatePlanError(f"{placeholder} not found in template")
+
+    p_element = paragraphs[0]._element
+    parent = p_element.getparent()
+    before, after = p_element.getprevious(), p_element.getnext()
+
+    replace(doc)
+
+    start = 0 if before is None else parent.index(before) + 1
+    end = len(parent) if after is None else parent.index(after)
+    return list(parent)[start:end]
+
+
+def _mark(elements, literal, name):
+    """Swaps the first `literal` found in the run text of `elements` for the `name` field marker."""
+    for element in elements:
+        for t in element.iter(qn("w:t")):
+            if t.text and literal in t.text:
+                t.text = t.text.replace(literal, field(name), 1)
+                return
+    raise TemplatePlanError(f"{literal!r} not found while marking field {name!r}")
+
+
+def _has_field(element):
+    from lxml import etree
+
+    return "\ue000" in etree.tostring(element, encoding="unicode")
+
+
+class ValueSlot:
+    """
+    A placeholder replaced by a fixed set of paragraphs with a single `value` field:
+    table/paragraph scalars and titled sections that disappear when empty.
+    """
+
+    def __init__(self, kind, fragment, empty):
+        self.kind = kind
+        self.fragment = fragment
+        self.empty = empty
+
+    @classmethod
+    def compile(cls, template, placeholder, kind, replace, sample=None, empty="", tables=False):
+        """
+        - `replace(doc, value)`: the legacy replace_* call for this placeholder
+        - `sample`: a stand-in value whose text is marked as the field (defaults to the marker itself)
+        - `empty`: the value the replacer gets when the form field is blank
+        """
+        stand_in = field("value") if sample is None else sample
+        filled = capture(template, placeholder, lambda doc: replace(doc, stand_in), tables)
+        if sample is not None:
+            _mark(filled, str(sample), "value")
+        fragment = Fragment(filled)
+        if fragment.fields != {"value"}:
+            raise TemplatePlanError(f"{placeholder} did not produce a value field")
+
+        blank = capture(template, placeholder, lambda doc: replace(doc, empty), tables)
+        return cls(kind, fragment, Fragment(blank).render({}))
+
+    @staticmethod
+    def input_key(value):
+        return value
+
+    def render(self, value):
+        """Renders `value`, or the blank form of the slot when `value` is None."""
+        if value is None:
+            return self.empty
+        return self.fragment.render({"value": value})
+
+
+class RepeatSlot:
+    """
+    A placeholder replaced by an optional heading, one block of paragraphs per item and
+    a trailing block: numbered lists, CO lists, units and hyperlink lists.
+    """
+
+    def __init__(self, kind, empty, head, item, tail):
+        self.kind = kind
+        self.empty = empty
+        self.head = head
+        self.item = item
+        self.tail = tail
+
+    @classmethod
+    def compile(cls, template, placeholder, kind, replace, sample, counter=None):
+        """
+        - `replace(doc, items)`: the legacy replace_* call for this placeholder
+        - `sample`: one stand-in item built from field() markers
+        - `counter`: the item number text as the replacer writes it for item 1 (becomes field `n`)
+        """
+        elements = capture(template, placeholder, lambda doc: replace(doc, [sample]))
+        marked = [i for i, element in enumerate(elements) if _has_field(element)]
+        if not marked:
+            raise TemplatePlanError(f"{placeholder} did not produce any item fields")
+        first, last = marked[0], marked[-1] + 1
+
+        item_elements = elements[first:last]
+        if counter is not None:
+            _mark(item_elements, counter, "n")
+
+        blank = capture(template, placeholder, lambda doc: replace(doc, []))
+        return cls(
+            kind,
+            Fragment(blank).render({}),
+            Fragment(elements[:first]).render({}),
+            Fragment(item_elements),
+            Fragment(elements[last:]).render({}),
+        )
+
+    @staticmethod
+    def input_key(items):
+        return tuple(tuple(values.values()) for values in items)
+
+    def render(self, items):
+        """Renders a list of field dicts, numbering them from 1."""
+        if not items:
+            return self.empty
+        out = [self.head]
+        for n, values in enumerate(items, 1):
+            out.append(self.item.render(dict(values, n=str(n))))
+        out.append(self.tail)
+        return "".join(out)
+
+
+class SectionCache:
+    """
+    Rendered slot output (UTF-8 bytes) keyed by slot and input, least recently used first
+    under `max_bytes`. Each entry is charged twice its output size, which also covers the
+    input held in its key (slot output always contains its input).
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    @property
+    def nbytes(self):
+        return self._size
+
+    def __reduce__(self):
+        return SectionCache, (self.max_bytes,)  # Pickled (in prebuilt snapshots) empty
+
+    def put(self, key, data):
+        cost = 2 * len(data)
+        if cost * 4 > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= 2 * len(old)
+            self._entries[key] = data
+            self._size += cost
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= 2 * len(evicted)
+
+
+class RenderPlan:
+    """
+    A template's word/document.xml compiled into static chunks around named slots.
+    Rendering joins the chunks with each slot's output; no XML is parsed or built.
+    With a SectionCache in `sections`, the output of every non-scalar slot is kept by
+    its input, so re-rendering a course after a small edit re-renders only the
+    sections whose input changed and stitches the rest from the cache.
+    """
+
+    def __init__(self, chunks, names, slots, sections=None):
+        self.chunks = [chunk.encode("utf-8") for chunk in chunks]
+        self.names = names
+        self.slots = slots
+        self.sections = sections
+
+    @property
+    def nbytes(self):
+        """Rough memory held: the static chunks plus what the section cache holds right now."""
+        return sum(map(len, self.chunks)) + (self.sections.nbytes if self.sections is not None else 0)
+
+    def render(self, values):
+        """
+        Returns document.xml bytes. `values` maps each placeholder to its slot input.
+        Each slot is timed as stage "slot:<Placeholder>", section cache hits included.
+        """
+        chunks = self.chunks
+        sections = self.sections
+        out = [_XML_DECLARATION_BYTES, chunks[0]]
+        for i, name in enumerate(self.names):
+            start = time.perf_counter()
+            slot = self.slots[i]
+            value = values.get(name)
+            if sections is None or not value or slot.kind == "scalar":
+                out.append(slot.render(value).encode("utf-8"))
+            else:
+                key = (i, slot.input_key(value))
+                data = sections.get(key)
+                if data is None:
+                    data = slot.render(value).encode("utf-8")
+                    sections.put(key, data)
+                out.append(data)
+            record_stage(f"slot:{name[1:-1]}", time.perf_counter() - start)
+            out.append(chunks[i + 1])
+        return b"".join(out)
+
+
+def compile_plan(template, builders, sections=None):
+    """
+    Compiles `template` (a TemplateSnapshot) into a RenderPlan.
+    - `builders`: {placeholder: (tables, build)} where build(template) returns the slot
+    - `sections`: an optional SectionCache for the plan's rendered sections
+    Placeholders missing from the template are skipped, as the replacers would.
+    Raises TemplatePlanError if two slots share a paragraph or a capture fails.
+    """
+    from lxml import etree
+
+    doc = template.new_document()
+    names, slots, seen = [], [], set()
+
+    for placeholder, (tables, build) in builders.items():
+        paragraphs = find_paragraphs(doc, placeholder, tables=tables)
+        if not paragraphs:
+            continue
+        p_element = paragraphs[0]._element
+        if p_element in seen:
+            raise TemplatePlanError(f"{placeholder} shares a paragraph with another placeholder")
+        seen.add(p_element)
+
+        slots.append(build(template))
+        p_element.addprevious(etree.Comment(f"\ue002slot{len(names)}"))
+        p_element.getparent().remove(p_element)
+        names.append(placeholder)
+
+    xml = etree.tostring(doc.element, encoding="unicode")
+    pieces = _SLOT_RE.split(xml)
+    order = [int(i) for i in pieces[1::2]]  # Slot numbers in document order
+    if sorted(order) != list(range(len(names))):
+        raise TemplatePlanError("slot markers lost while serialising the template")
+    return RenderPlan(pieces[0::2], [names[i] for i in order], [slots[i] for i in order], sections)